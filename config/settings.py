@@ -165,10 +165,15 @@ class EnhancedVisionConfig:
     # 人脸识别
     face_recognition_enabled: bool = True
     face_database_path: str = "data/faces"
+    face_detection_opencl: bool = False  # 进程已启用OpenCL时，本地人脸检测用UMat交给GPU
     
     # 手势识别
     gesture_recognition_enabled: bool = True
     
+    # 上传到视觉API前缩小图像并重新压缩为JPEG
+    upload_max_side: int = 1024  # 最长边像素
+    upload_jpeg_quality: int = 85
+    
     # 模型配置
     yolo_model_path: str = "models/yolov8n.pt"
     scene_model: str = "microsoft/resnet-50"  # 场景分类模型
@@ -930,8 +930,7 @@ class AILifeGUI:
             
             # 清理知识缓存
             if len(self.knowledge_manager.knowledge_base['discoveries']) > 50:
-                self.knowledge_manager.knowledge_base['discoveries'] = \
-                    self.knowledge_manager.knowledge_base['discoveries'][-50:]
+                self.knowledge_manager.trim_discoveries(50)
                 cache_cleaned += 1
             
             # 清理对话历史
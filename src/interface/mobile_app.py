@@ -3,9 +3,16 @@
 """
 import logging
 import json
+import asyncio
+import os
 import threading
-import queue
+import atexit
 import socket
+import time
+import re
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import base64
@@ -32,15 +39,99 @@ except ImportError:
 try:
     # 使用Flask创建Web API
     from flask import Flask, request, jsonify, render_template_string
-    from flask_socketio import SocketIO, emit
+    from flask.json.provider import DefaultJSONProvider
+    from flask_socketio import SocketIO, emit, join_room
     FLASK_AVAILABLE = True
 except ImportError:
     FLASK_AVAILABLE = False
 
+try:
+    # 更快的JSON编码器
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    # 协程服务器（需在进程入口、导入其他模块之前调用 eventlet.monkey_patch()）
+    import eventlet
+    import eventlet.patcher
+    import eventlet.tpool
+    EVENTLET_AVAILABLE = True
+except ImportError:
+    EVENTLET_AVAILABLE = False
+
+try:
+    # 同上，需在进程入口调用 gevent.monkey.patch_all()
+    import gevent
+    import gevent.monkey
+    GEVENT_AVAILABLE = True
+except ImportError:
+    GEVENT_AVAILABLE = False
+
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# 所有移动设备共享的广播房间
+BROADCAST_ROOM = 'all_devices'
+
+# 单条消息的最大长度
+MAX_MESSAGE_LENGTH = 4096
+
+# 不可见的控制字符（保留换行和制表符）
+_CONTROL_CHARS_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+
+# 秒级时间戳缓存: [整数秒, ISO字符串]
+_ts_cache = [0, '']
+
+def _iso_now() -> str:
+    """返回秒级精度的ISO时间字符串，同一秒内复用已格式化的结果"""
+    now = time.time()
+    second = int(now)
+    if second != _ts_cache[0]:
+        _ts_cache[1] = datetime.fromtimestamp(second).isoformat()
+        _ts_cache[0] = second
+    return _ts_cache[1]
+
+class _ORJSONCodec:
+    """供Socket.IO使用的orjson编解码器（接口与json模块一致）"""
+    
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
+if FLASK_AVAILABLE and ORJSON_AVAILABLE:
+    class ORJSONProvider(DefaultJSONProvider):
+        """使用orjson的Flask JSON提供器"""
+        
+        def dumps(self, obj, **kwargs) -> str:
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+def _is_monkey_patched(mode: str) -> bool:
+    """检查进程是否已为指定的协程库打过monkey补丁"""
+    if mode == 'eventlet' and EVENTLET_AVAILABLE:
+        return (eventlet.patcher.is_monkey_patched('socket')
+                and eventlet.patcher.is_monkey_patched('thread'))
+    if mode == 'gevent' and GEVENT_AVAILABLE:
+        return (gevent.monkey.is_module_patched('socket')
+                and gevent.monkey.is_module_patched('threading'))
+    return False
+
+@dataclass(slots=True)
+class ConnectedDevice:
+    """已连接的移动设备"""
+    connect_time: datetime
+    ip: str
+    user_agent: str
+
 class MobileApp:
     """移动端应用系统"""
     
@@ -55,24 +146,72 @@ class MobileApp:
             'port': 8080,
             'host': '0.0.0.0',
             'enable_push_notifications': True,
-            'offline_mode': True
+            'offline_mode': True,
+            'async_mode': 'threading',  # 'eventlet'/'gevent' 仅在进程已打过monkey补丁时生效
+            'think_workers': 4,
+            'max_workers': min(32, (os.cpu_count() or 1) * 4),  # 简单服务器的并发请求上限
+            'status_interval': 5,  # 状态推送检查间隔（秒）
+            'batch_window': 0.005,  # 广播合并窗口（秒）
+            'batch_max_items': 64,
+            'out_queue_size': 4096,
+            'max_http_buffer_size': 1 << 20,
+            'compression_threshold': 2048  # 小于此大小的响应不压缩
         }
         
+        # AI名称及依赖它的缓存内容（使用前经 refresh_ai_name 与性格设置同步）
+        self._ai_name = settings.personality.name
+        self._welcome_message = f"你好！我是{self._ai_name}，很高兴在移动端见到你！"
+        self._html_cache = None
+        
         # 连接管理
         self.connected_devices = {}
-        self.message_queue = queue.Queue()
+        self._device_count = 0
+        self._device_lock = threading.Lock()
         
         # Web服务器
         self.flask_app = None
         self.socketio = None
         self.server_thread = None
+        self.async_mode = 'threading'
+        self._think_pool = None
+        
+        # 出站广播队列（由后台任务合并发送）
+        self._out_queue = None
+        self._out_event = None
+        self._batch_running = False
+        self._last_status_digest = None
         
         # Kivy应用
         self.kivy_app = None
         
+        # 本地IP缓存
+        self._local_ip = None
+        self._local_ip_time = 0.0
+        self._local_ip_ttl = 300  # 秒
+        
         # 消息历史
-        self.mobile_messages = []
         self.max_messages = 100
+        self.mobile_messages = deque(maxlen=self.max_messages)
+        
+        # 回应缓存 (LRU)，键为 (规范化消息, 当前情绪)
+        self._resp_cache = OrderedDict()
+        self._resp_cache_size = 128
+        self._resp_cache_lock = threading.Lock()
+        self._resp_cache_hits = 0
+        self._resp_cache_misses = 0
+        self._direct_replies = 0
+        
+        # 移动端消息的固定上下文，每条消息只补充当前情绪
+        self._ctx_template = {
+            'user_interaction': True,
+            'platform': 'mobile'
+        }
+        
+        # 每个工作线程复用一个事件循环
+        self._loop_tls = threading.local()
+        self._loops = []
+        self._loops_lock = threading.Lock()
+        atexit.register(self._close_loops)
     
     def start_mobile_support(self, interface_type: str = 'web'):
         """启动移动端支持"""
@@ -93,22 +232,44 @@ class MobileApp:
     
     def _start_web_interface(self):
         """启动Web界面"""
+        self.async_mode = self._select_async_mode()
+        self._ensure_think_pool()
+        
         self.flask_app = Flask(__name__)
-        self.socketio = SocketIO(self.flask_app, cors_allowed_origins="*")
+        socketio_options = {}
+        if ORJSON_AVAILABLE:
+            self.flask_app.json = ORJSONProvider(self.flask_app)
+            socketio_options['json'] = _ORJSONCodec
+        
+        self.socketio = SocketIO(
+            self.flask_app,
+            async_mode=self.async_mode,
+            cors_allowed_origins="*",
+            async_handlers=True,
+            max_http_buffer_size=self.mobile_config['max_http_buffer_size'],
+            compression_threshold=self.mobile_config['compression_threshold'],
+            **socketio_options
+        )
         
         # 注册路由
         self._register_web_routes()
         self._register_socket_events()
+        self._batch_running = True
         
         # 启动服务器
         def run_server():
-            self.socketio.run(
-                self.flask_app,
-                host=self.mobile_config['host'],
-                port=self.mobile_config['port'],
-                debug=False,
-                allow_unsafe_werkzeug=True
-            )
+            # 后台任务要在服务器所在的线程里启动，协程模式下才会被该线程的hub调度
+            self._start_broadcast_batcher()
+            self.socketio.start_background_task(self._status_push_loop)
+            run_kwargs = {
+                'host': self.mobile_config['host'],
+                'port': self.mobile_config['port'],
+                'debug': False
+            }
+            if self.async_mode == 'threading':
+                # 仅在没有协程服务器时回退到Werkzeug开发服务器
+                run_kwargs['allow_unsafe_werkzeug'] = True
+            self.socketio.run(self.flask_app, **run_kwargs)
         
         self.server_thread = threading.Thread(target=run_server, daemon=True)
         self.server_thread.start()
@@ -116,7 +277,7 @@ class MobileApp:
         # 显示访问信息
         local_ip = self._get_local_ip()
         port = self.mobile_config['port']
-        logger.info(f"Web界面已启动:")
+        logger.info(f"Web界面已启动 (async_mode={self.async_mode}):")
         logger.info(f"  本地访问: http://localhost:{port}")
         logger.info(f"  网络访问: http://{local_ip}:{port}")
         logger.info(f"  移动端可通过上述地址访问")
@@ -132,22 +293,27 @@ class MobileApp:
         def send_message():
             try:
                 data = request.get_json()
-                message = data.get('message', '')
+                message = self._normalize(data.get('message', ''))
+                
+                # 空白、过长等无效消息直接回复发送方，不交给AI也不广播
+                trivial = self._trivial_response(message)
+                if trivial is not None:
+                    return jsonify({'success': True, 'response': trivial})
                 
-                if message and self.ai_brain:
+                if self.ai_brain:
                     # 处理用户消息
-                    response = self._process_mobile_message(message)
+                    response = self._respond(message)
                     
                     # 广播给所有连接的设备
-                    self.socketio.emit('new_message', {
+                    self._broadcast('new_message', {
                         'type': 'ai_response',
                         'content': response,
-                        'timestamp': datetime.now().isoformat()
+                        'timestamp': _iso_now()
                     })
                     
                     return jsonify({'success': True, 'response': response})
                 
-                return jsonify({'success': False, 'error': '消息为空'})
+                return jsonify({'success': False, 'error': 'AI尚未就绪'})
                 
             except Exception as e:
                 logger.error(f"处理移动端消息失败: {e}")
@@ -181,16 +347,22 @@ class MobileApp:
         @self.socketio.on('connect')
         def handle_connect():
             device_id = request.sid
-            self.connected_devices[device_id] = {
-                'connect_time': datetime.now(),
-                'ip': request.remote_addr,
-                'user_agent': request.headers.get('User-Agent', '')
-            }
+            device = ConnectedDevice(
+                connect_time=datetime.now(),
+                ip=request.remote_addr,
+                user_agent=request.headers.get('User-Agent', '')
+            )
+            with self._device_lock:
+                if device_id not in self.connected_devices:
+                    self._device_count += 1
+                self.connected_devices[device_id] = device
+            join_room(BROADCAST_ROOM)
             
+            self.refresh_ai_name()
             emit('connected', {
                 'device_id': device_id,
-                'ai_name': settings.personality.name,
-                'welcome_message': f"你好！我是{settings.personality.name}，很高兴在移动端见到你！"
+                'ai_name': self._ai_name,
+                'welcome_message': self._welcome_message
             })
             
             logger.info(f"移动设备连接: {device_id} ({request.remote_addr})")
@@ -198,32 +370,38 @@ class MobileApp:
         @self.socketio.on('disconnect')
         def handle_disconnect():
             device_id = request.sid
-            if device_id in self.connected_devices:
-                del self.connected_devices[device_id]
+            with self._device_lock:
+                if self.connected_devices.pop(device_id, None) is not None:
+                    self._device_count -= 1
             logger.info(f"移动设备断开: {device_id}")
         
         @self.socketio.on('user_message')
         def handle_user_message(data):
             try:
-                message = data.get('message', '')
+                message = self._normalize(data.get('message', ''))
                 device_id = request.sid
                 
-                if message:
-                    # 记录消息
-                    self._add_mobile_message('user', message, device_id)
-                    
-                    # 处理消息
-                    response = self._process_mobile_message(message)
-                    
-                    # 发送回应
-                    emit('ai_response', {
-                        'content': response,
-                        'timestamp': datetime.now().isoformat(),
-                        'emotion': self.emotion_engine.get_current_emotion() if self.emotion_engine else None
-                    })
-                    
-                    # 记录AI回应
-                    self._add_mobile_message('ai', response, device_id)
+                # 空白、过长等无效消息直接回复发送方，不记录到消息历史
+                trivial = self._trivial_response(message)
+                if trivial is not None:
+                    emit('ai_response', {'content': trivial, 'timestamp': _iso_now(), 'emotion': None})
+                    return
+                
+                # 记录消息
+                self._add_mobile_message('user', message, device_id)
+                
+                # 处理消息
+                response = self._respond(message)
+                
+                # 发送回应
+                emit('ai_response', {
+                    'content': response,
+                    'timestamp': _iso_now(),
+                    'emotion': self.emotion_engine.get_current_emotion() if self.emotion_engine else None
+                })
+                
+                # 记录AI回应
+                self._add_mobile_message('ai', response, device_id)
                 
             except Exception as e:
                 logger.error(f"处理Socket消息失败: {e}")
@@ -262,12 +440,14 @@ class MobileApp:
     
     def _create_kivy_interface(self):
         """创建Kivy界面"""
+        self.refresh_ai_name()
+        
         # 主布局
         main_layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
         
         # 标题
         title = Label(
-            text=f'🌟 {settings.personality.name} - 移动版',
+            text=f'🌟 {self._ai_name} - 移动版',
             size_hint_y=None,
             height='48dp',
             font_size='20sp'
@@ -313,19 +493,19 @@ class MobileApp:
         main_layout.add_widget(button_layout)
         
         # 添加欢迎消息
-        self._add_kivy_message('AI', f'你好！我是{settings.personality.name}！')
+        self._add_kivy_message('AI', f'你好！我是{self._ai_name}！')
         
         return main_layout
     
     def _kivy_send_message(self, instance):
         """Kivy发送消息"""
-        message = self.message_input.text.strip()
+        message = self._normalize(self.message_input.text)
         if message:
             self._add_kivy_message('你', message)
             self.message_input.text = ''
             
             # 处理消息
-            response = self._process_mobile_message(message)
+            response = self._respond(message)
             Clock.schedule_once(lambda dt: self._add_kivy_message('AI', response), 0.5)
     
     def _kivy_trigger_emotion(self, emotion):
@@ -352,9 +532,11 @@ class MobileApp:
     def _start_simple_web_interface(self):
         """启动简单Web界面（无依赖）"""
         import http.server
-        import socketserver
         from urllib.parse import parse_qs
         
+        mobile_app = self
+        self._ensure_think_pool()
+        
         class SimpleHandler(http.server.BaseHTTPRequestHandler):
             def do_GET(self):
                 if self.path == '/':
@@ -372,8 +554,8 @@ class MobileApp:
                     post_data = self.rfile.read(content_length)
                     data = parse_qs(post_data.decode('utf-8'))
                     
-                    message = data.get('message', [''])[0]
-                    response = self._process_mobile_message(message)
+                    message = mobile_app._normalize(data.get('message', [''])[0])
+                    response = mobile_app._respond(message)
                     
                     self.send_response(200)
                     self.send_header('Content-type', 'application/json; charset=utf-8')
@@ -381,13 +563,77 @@ class MobileApp:
                     result = json.dumps({'response': response}, ensure_ascii=False)
                     self.wfile.write(result.encode('utf-8'))
         
+        class BoundedThreadingHTTPServer(http.server.ThreadingHTTPServer):
+            """每个请求一个线程，但用信号量限制同时处理的请求数"""
+            daemon_threads = True
+            
+            def __init__(self, server_address, handler_class, max_workers):
+                self._slots = threading.BoundedSemaphore(max_workers)
+                super().__init__(server_address, handler_class)
+            
+            def get_request(self):
+                request, client_address = super().get_request()
+                # 小包响应为主，关闭Nagle算法避免延迟
+                request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                return request, client_address
+            
+            def process_request(self, request, client_address):
+                # 并发已满时在接受循环中等待，形成背压
+                self._slots.acquire()
+                try:
+                    super().process_request(request, client_address)
+                except Exception:
+                    self._slots.release()
+                    raise
+            
+            def process_request_thread(self, request, client_address):
+                try:
+                    super().process_request_thread(request, client_address)
+                finally:
+                    self._slots.release()
+        
         # 启动简单服务器
         def run_simple_server():
-            with socketserver.TCPServer(("", 8080), SimpleHandler) as httpd:
+            address = ("", self.mobile_config['port'])
+            with BoundedThreadingHTTPServer(address, SimpleHandler, self.mobile_config['max_workers']) as httpd:
                 httpd.serve_forever()
         
-        server_thread = threading.Thread(target=run_simple_server, daemon=True)
-        server_thread.start()
+        self.server_thread = threading.Thread(target=run_simple_server, daemon=True)
+        self.server_thread.start()
+    
+    def _ensure_think_pool(self):
+        """创建用于AI思考的线程池（每个工作线程复用自己的事件循环）"""
+        if self._think_pool is None:
+            self._think_pool = ThreadPoolExecutor(
+                max_workers=self.mobile_config['think_workers'],
+                thread_name_prefix='mobile-think'
+            )
+    
+    @staticmethod
+    def _normalize(message: str) -> str:
+        """规范化用户消息，入口处调用一次，之后各环节直接使用结果"""
+        return message.strip()
+    
+    def _respond(self, message: str) -> str:
+        """生成回应：无效输入直接返回，其余交给AI处理（message需已规范化）"""
+        response = self._trivial_response(message)
+        if response is not None:
+            return response
+        return self._run_blocking(self._process_mobile_message, message)
+    
+    def _trivial_response(self, message: str) -> Optional[str]:
+        """对空白、过长或含控制字符的消息直接给出固定回应"""
+        if not message:
+            response = "你好像什么都没说呢~ 🤔"
+        elif len(message) > MAX_MESSAGE_LENGTH:
+            response = "这条消息太长啦，能说得简短一点吗？"
+        elif _CONTROL_CHARS_RE.search(message):
+            response = "这条消息里有些奇怪的字符，我看不懂呢 😵"
+        else:
+            return None
+        
+        self._direct_replies += 1
+        return response
     
     def _process_mobile_message(self, message: str) -> str:
         """处理移动端消息"""
@@ -401,20 +647,23 @@ class MobileApp:
                         'source': 'mobile_interaction'
                     })
                 
+                current_emotion = self.emotion_engine.get_current_emotion() if self.emotion_engine else None
+                
+                # 命中缓存则直接返回，避免重复思考
+                cache_key = (message.lower(), (current_emotion or {}).get('emotion'))
+                cached = self._get_cached_response(cache_key)
+                if cached is not None:
+                    return cached
+                
                 # 生成回应
-                import asyncio
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
+                loop = self._get_loop()
                 
-                context = {
-                    'user_interaction': True,
-                    'platform': 'mobile',
-                    'current_emotion': self.emotion_engine.get_current_emotion() if self.emotion_engine else None
-                }
+                context = self._ctx_template.copy()
+                context['current_emotion'] = current_emotion
                 
                 response = loop.run_until_complete(self.ai_brain.think(message, context))
-                loop.close()
                 
+                self._store_cached_response(cache_key, response)
                 return response
             else:
                 return "很抱歉，AI大脑暂时不可用。但我还在这里陪着你！"
@@ -423,12 +672,75 @@ class MobileApp:
             logger.error(f"处理移动端消息失败: {e}")
             return "哎呀，我的脑袋有点转不过来了... 😵"
     
+    def _select_async_mode(self) -> str:
+        """选择Socket.IO的异步模式"""
+        mode = self.mobile_config.get('async_mode') or 'threading'
+        if mode in ('eventlet', 'gevent') and not _is_monkey_patched(mode):
+            # 未打补丁时阻塞调用会卡住协程调度，服务器线程也不属于协程的hub
+            logger.warning(f"{mode} 未在进程入口打monkey补丁，移动端服务器改用threading模式")
+            return 'threading'
+        return mode
+    
+    def _run_blocking(self, func, *args):
+        """在线程池中执行阻塞调用，避免阻塞服务器的事件循环"""
+        if self.async_mode == 'eventlet':
+            return eventlet.tpool.execute(func, *args)
+        if self.async_mode == 'gevent':
+            return gevent.get_hub().threadpool.apply(func, args)
+        if self._think_pool:
+            return self._think_pool.submit(func, *args).result()
+        return func(*args)
+    
+    def _get_loop(self):
+        """获取当前线程的事件循环（首次调用时创建）"""
+        loop = getattr(self._loop_tls, 'loop', None)
+        if loop is None or loop.is_closed():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self._loop_tls.loop = loop
+            with self._loops_lock:
+                self._loops.append(loop)
+        return loop
+    
+    def _close_loops(self):
+        """关闭所有工作线程的事件循环"""
+        with self._loops_lock:
+            loops, self._loops = self._loops, []
+        for loop in loops:
+            try:
+                if not loop.is_closed() and not loop.is_running():
+                    loop.close()
+            except Exception as e:
+                logger.debug(f"关闭事件循环失败: {e}")
+    
+    def _get_cached_response(self, key) -> Optional[str]:
+        """查询回应缓存"""
+        with self._resp_cache_lock:
+            response = self._resp_cache.get(key)
+            if response is None:
+                self._resp_cache_misses += 1
+                return None
+            
+            self._resp_cache.move_to_end(key)
+            self._resp_cache_hits += 1
+        
+        logger.debug(f"回应缓存命中 (命中: {self._resp_cache_hits}, 未命中: {self._resp_cache_misses})")
+        return response
+    
+    def _store_cached_response(self, key, response: str):
+        """写入回应缓存"""
+        with self._resp_cache_lock:
+            self._resp_cache[key] = response
+            self._resp_cache.move_to_end(key)
+            while len(self._resp_cache) > self._resp_cache_size:
+                self._resp_cache.popitem(last=False)
+    
     def _get_ai_status(self) -> Dict[str, Any]:
         """获取AI状态"""
         status = {
-            'timestamp': datetime.now().isoformat(),
-            'connected_devices': len(self.connected_devices),
-            'ai_name': settings.personality.name
+            'timestamp': _iso_now(),
+            'connected_devices': self._device_count,
+            'ai_name': self._ai_name
         }
         
         if self.emotion_engine:
@@ -445,36 +757,55 @@ class MobileApp:
             'sender': sender,
             'content': content,
             'device_id': device_id,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': _iso_now()
         }
         
+        # deque 自动淘汰最旧的消息
         self.mobile_messages.append(message)
-        
-        # 保持消息数量限制
-        if len(self.mobile_messages) > self.max_messages:
-            self.mobile_messages = self.mobile_messages[-self.max_messages:]
     
     def _get_local_ip(self) -> str:
-        """获取本地IP地址"""
+        """获取本地IP地址（结果在TTL内缓存）"""
+        now = time.monotonic()
+        if self._local_ip and now - self._local_ip_time < self._local_ip_ttl:
+            return self._local_ip
+        
         try:
             # 创建一个socket连接来获取本地IP
             s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             s.connect(("8.8.8.8", 80))
             ip = s.getsockname()[0]
             s.close()
-            return ip
         except:
             return "localhost"
+        
+        self._local_ip = ip
+        self._local_ip_time = now
+        return ip
+    
+    def refresh_ai_name(self):
+        """性格设置中的名称变化后，刷新AI名称及缓存的页面"""
+        if settings.personality.name == self._ai_name:
+            return
+        self._ai_name = settings.personality.name
+        self._welcome_message = f"你好！我是{self._ai_name}，很高兴在移动端见到你！"
+        self._html_cache = None
     
     def _get_mobile_html_template(self) -> str:
-        """获取移动端HTML模板"""
+        """获取移动端HTML模板（渲染一次后缓存）"""
+        self.refresh_ai_name()
+        if self._html_cache is None:
+            self._html_cache = self._render_mobile_html()
+        return self._html_cache
+    
+    def _render_mobile_html(self) -> str:
+        """渲染移动端HTML页面"""
         return '''
 <!DOCTYPE html>
 <html lang="zh-CN">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>🌟 ''' + settings.personality.name + ''' - 移动版</title>
+    <title>🌟 ''' + self._ai_name + ''' - 移动版</title>
     <style>
         * { margin: 0; padding: 0; box-sizing: border-box; }
         body { 
@@ -530,7 +861,7 @@ class MobileApp:
     <script src="https://cdnjs.cloudflare.com/ajax/libs/socket.io/4.0.1/socket.io.js"></script>
 </head>
 <body>
-    <div class="header">🌟 ''' + settings.personality.name + ''' - 移动版</div>
+    <div class="header">🌟 ''' + self._ai_name + ''' - 移动版</div>
     <div class="status-bar" id="status">连接中...</div>
     
     <div class="emotion-bar">
@@ -557,16 +888,44 @@ class MobileApp:
         socket.on('connected', function(data) {
             statusBar.textContent = '已连接 - ' + data.ai_name;
             addMessage('ai', data.welcome_message);
+            // 连接时获取一次状态，之后由服务器在状态变化时推送
+            socket.emit('request_status');
         });
 
         socket.on('ai_response', function(data) {
             addMessage('ai', data.content);
         });
 
-        socket.on('status_update', function(data) {
+        function updateStatus(data) {
             if (data.emotion) {
                 statusBar.textContent = '情绪: ' + data.emotion.emotion + ' | 设备: ' + data.connected_devices;
             }
+        }
+
+        socket.on('status_update', updateStatus);
+
+        // 服务器合并发送的广播事件
+        const batchHandlers = {
+            'status_update': updateStatus,
+            'new_message': function(data) {
+                addMessage('ai', data.content);
+            },
+            'broadcast_message': function(data) {
+                if (data.type === 'notification') {
+                    addMessage('ai', data.content.title + ': ' + data.content.message);
+                } else if (typeof data.content === 'string') {
+                    addMessage('ai', data.content);
+                }
+            }
+        };
+
+        socket.on('batch', function(data) {
+            data.batch.forEach(function(item) {
+                const handler = batchHandlers[item.event];
+                if (handler) {
+                    handler(item.data);
+                }
+            });
         });
 
         function addMessage(sender, content) {
@@ -601,11 +960,6 @@ class MobileApp:
                     }
                 });
         }
-
-        // 定期更新状态
-        setInterval(() => {
-            socket.emit('request_status');
-        }, 5000);
     </script>
 </body>
 </html>
@@ -613,12 +967,77 @@ class MobileApp:
     
     def broadcast_to_mobile(self, message_type: str, content: Any):
         """向所有移动设备广播消息"""
-        if self.socketio:
-            self.socketio.emit('broadcast_message', {
-                'type': message_type,
-                'content': content,
-                'timestamp': datetime.now().isoformat()
-            })
+        self._broadcast('broadcast_message', {
+            'type': message_type,
+            'content': content,
+            'timestamp': _iso_now()
+        })
+    
+    def _broadcast(self, event: str, payload: Dict[str, Any]):
+        """将广播事件放入出站队列，没有设备连接时直接跳过"""
+        if not self.socketio or self._device_count == 0:
+            return
+        
+        if self._out_queue is None:
+            self.socketio.emit(event, payload, to=BROADCAST_ROOM)
+            return
+        
+        # deque 的 append/popleft 是原子操作，满时自动丢弃最旧的消息
+        if len(self._out_queue) == self._out_queue.maxlen:
+            logger.warning("移动端广播队列已满，丢弃最旧的消息")
+        self._out_queue.append((event, payload))
+        self._out_event.set()
+    
+    def _start_broadcast_batcher(self):
+        """启动广播合并任务"""
+        # 先创建事件再发布队列，_broadcast 看到队列时事件一定可用
+        self._out_event = self.socketio.server.eio.create_event()
+        self._out_queue = deque(maxlen=self.mobile_config['out_queue_size'])
+        self.socketio.start_background_task(self._broadcast_batch_loop)
+    
+    def _status_push_loop(self):
+        """定期计算一次状态，仅在变化时广播给所有设备"""
+        while self._batch_running:
+            self.socketio.sleep(self.mobile_config['status_interval'])
+            if self._device_count == 0:
+                continue
+            
+            try:
+                status = self._get_ai_status()
+                digest = hash(json.dumps(
+                    {k: v for k, v in status.items() if k != 'timestamp'},
+                    sort_keys=True, default=str
+                ))
+                if digest != self._last_status_digest:
+                    self._last_status_digest = digest
+                    self._broadcast('status_update', status)
+            except Exception as e:
+                logger.error(f"推送移动端状态失败: {e}")
+    
+    def _broadcast_batch_loop(self):
+        """在合并窗口内收集广播事件，作为一个batch事件发送"""
+        window = self.mobile_config['batch_window']
+        max_items = self.mobile_config['batch_max_items']
+        
+        while self._batch_running:
+            if not self._out_queue:
+                self._out_event.wait(timeout=1.0)
+                self._out_event.clear()
+                if not self._out_queue:
+                    continue
+                # 等待合并窗口，让短时间内的后续事件一起发送
+                self.socketio.sleep(window)
+            
+            batch = []
+            while self._out_queue and len(batch) < max_items:
+                batch.append(self._out_queue.popleft())
+            
+            try:
+                self.socketio.emit('batch', {
+                    'batch': [{'event': event, 'data': payload} for event, payload in batch]
+                }, to=BROADCAST_ROOM)
+            except Exception as e:
+                logger.error(f"发送广播批次失败: {e}")
     
     def send_push_notification(self, title: str, message: str):
         """发送推送通知（模拟）"""
@@ -626,7 +1045,7 @@ class MobileApp:
         notification = {
             'title': title,
             'message': message,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': _iso_now()
         }
         
         logger.info(f"推送通知: {title} - {message}")
@@ -637,9 +1056,15 @@ class MobileApp:
     def get_mobile_stats(self) -> Dict[str, Any]:
         """获取移动端统计信息"""
         return {
-            'connected_devices': len(self.connected_devices),
+            'connected_devices': self._device_count,
             'total_messages': len(self.mobile_messages),
             'interface_type': self.mobile_config['interface_type'],
+            'response_cache': {
+                'size': len(self._resp_cache),
+                'hits': self._resp_cache_hits,
+                'misses': self._resp_cache_misses
+            },
+            'direct_replies': self._direct_replies,
             'server_running': self.server_thread is not None and self.server_thread.is_alive(),
             'supported_interfaces': {
                 'web': FLASK_AVAILABLE,
@@ -659,6 +1084,11 @@ class MobileApp:
             # 由于Flask服务器难以优雅关闭，这里只记录日志
             logger.info("移动端服务器正在关闭...")
         
+        self._batch_running = False
+        if self._think_pool:
+            self._think_pool.shutdown(wait=False)
+        
+        self._close_loops()
         logger.info("移动端支持已关闭")
 
 # 全局移动端实例
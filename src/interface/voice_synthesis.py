@@ -2,15 +2,54 @@
 语音合成模块 - 让AI能说话
 """
 import logging
+import json
 import requests
+from requests.adapters import HTTPAdapter
 import io
 import threading
 import queue
-from typing import Dict, List, Optional, Any
+import itertools
+from typing import Dict, List, Optional, Any, Iterator, Tuple, Union
 from datetime import datetime
 import random
 import tempfile
 import os
+import time
+import re
+import wave
+from xml.sax.saxutils import escape as xml_escape
+
+# 流式PCM格式：24kHz 16位单声道（OpenAI/ElevenLabs原生PCM输出格式）
+PCM_SAMPLE_RATE = 24000
+PCM_CHUNK_SIZE = 4096
+# 每次送入混音器的PCM块约0.25秒
+PCM_PLAY_BYTES = PCM_SAMPLE_RATE * 2 // 4
+# 按时长等待后，混音器时钟略有偏差时再确认播放状态的间隔（秒），远小于一个PCM块的时长
+PLAYBACK_POLL_INTERVAL = 0.05
+# 相邻语音之间Hann窗交叉淡化的采样数
+BLEND_SAMPLES = 512
+# 保留的上一段结尾在此时间内有效（秒）
+BLEND_TAIL_TTL = 5.0
+
+# 语音优先级：数值越小越先播放
+URGENT_PRIORITY = -1
+SHUTDOWN_PRIORITY = -2
+# 语音线程一次最多取出的同优先级语音数
+SPEECH_BATCH_SIZE = 4
+# 紧急语音在第一个句末标点处切分，先合成较短的首句以尽早出声
+_FIRST_SENTENCE_RE = re.compile(r'[。！？!?]|\.(?!\d)')
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    # 更快的JSON编码器，直接输出bytes
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 try:
     import pygame
@@ -23,10 +62,36 @@ try:
 except ImportError:
     pyttsx3 = None
 
+try:
+    import azure.cognitiveservices.speech as speechsdk
+except ImportError:
+    speechsdk = None
+
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+def _json_body(payload: Dict) -> bytes:
+    """把请求体编码为JSON bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+def _resample(samples, src_rate: int, dst_rate: int):
+    """线性插值重采样（float32采样数组）"""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    count = max(1, round(len(samples) * dst_rate / src_rate))
+    positions = np.linspace(0, len(samples) - 1, count, dtype=np.float32)
+    return np.interp(positions, np.arange(len(samples), dtype=np.float32), samples).astype(np.float32)
+
+def _stream_chunks(response) -> Iterator[bytes]:
+    """逐块读取流式响应，迭代结束或被关闭时释放连接"""
+    try:
+        yield from response.iter_content(PCM_CHUNK_SIZE)
+    finally:
+        response.close()
+
 class VoiceSynthesis:
     """语音合成系统 - 支持多种TTS服务"""
     
@@ -38,8 +103,28 @@ class VoiceSynthesis:
             'local': self._synthesize_with_local
         }
         
+        # 复用HTTP连接，避免每次合成都重新握手
+        self.http = requests.Session()
+        self.http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        
+        # 交叉淡化：保留的上一段语音结尾及其时间
+        self._pending_tail = None
+        self._pending_tail_time = 0.0
+        # 打断合成、下载和播放的信号，stop_speaking时置位，下一批语音开始时清除
+        self._playback_stop = threading.Event()
+        
+        # 预热的Azure合成器池 (合成器, 过期时间)，省去每次合成的WebSocket+TLS握手
+        self._azure_pool = queue.Queue()
+        self._azure_pool_size = 3
+        self._azure_max_age = 540  # 秒，赶在服务端空闲断开前替换
+        # 按语音风格缓存的SSML前后缀 (前缀, 后缀)
+        self._azure_ssml_parts = {}
+        
         # 语音队列
-        self.speech_queue = queue.Queue()
+        # 按 (优先级, 序号, 语音项) 排序，紧急语音直接插队
+        self.speech_queue = queue.PriorityQueue()
+        self._speech_seq = itertools.count()
+        self._batch_remaining = 0
         self.is_speaking = False
         self.speech_thread = None
         
@@ -62,11 +147,19 @@ class VoiceSynthesis:
             'fear': {'speed': 0.9, 'pitch': 1.1, 'style': 'nervous'}
         }
         
+        # 本地TTS引擎在使用它的线程中首次合成时创建并复用：SAPI5等COM驱动不能跨线程使用
+        self._pyttsx_local = threading.local()
+        # 临时音频文件只有一个，合成时加锁
+        self._pyttsx_lock = threading.Lock()
+        # 优先写到内存文件系统，减少磁盘I/O
+        tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        self._local_tts_path = os.path.join(tmp_dir, f'ai_tts_{os.getpid()}_{id(self)}.wav')
+        
         # 启动语音处理线程
         self._start_speech_thread()
         
-        # 初始化本地TTS引擎
-        self._init_local_tts()
+        # 后台预热Azure合成器
+        self._prewarm_azure_pool()
     
     def speak(self, text: str, emotion: str = 'neutral', priority: int = 1):
         """让AI说话"""
@@ -81,36 +174,53 @@ class VoiceSynthesis:
             'timestamp': datetime.now()
         }
         
-        self.speech_queue.put(speech_item)
+        self.speech_queue.put((priority, next(self._speech_seq), speech_item))
         logger.info(f"添加语音到队列: {text[:30]}...")
     
     def speak_immediately(self, text: str, emotion: str = 'neutral'):
-        """立即说话（清空队列）"""
-        # 清空当前队列
-        while not self.speech_queue.empty():
-            try:
-                self.speech_queue.get_nowait()
-            except queue.Empty:
-                break
-        
-        # 添加紧急语音
-        self.speak(text, emotion, priority=0)
+        """立即说话（插到队列最前面）"""
+        # 首句单独合成，剩余部分紧随其后，同优先级的两段会被同一批取出并衔接播放
+        match = _FIRST_SENTENCE_RE.search(text)
+        if match and text[match.end():].strip():
+            self.speak(text[:match.end()], emotion, priority=URGENT_PRIORITY)
+            self.speak(text[match.end():].lstrip(), emotion, priority=URGENT_PRIORITY)
+        else:
+            self.speak(text, emotion, priority=URGENT_PRIORITY)
     
     def _start_speech_thread(self):
         """启动语音处理线程"""
         def speech_worker():
             while True:
                 try:
-                    # 获取语音任务
-                    speech_item = self.speech_queue.get(timeout=1)
+                    # 获取语音任务，并顺带取出同优先级的后续任务
+                    batch = [self.speech_queue.get(timeout=1)]
+                    priority = batch[0][0]
+                    while len(batch) < SPEECH_BATCH_SIZE:
+                        try:
+                            entry = self.speech_queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if entry[0] != priority:
+                            self.speech_queue.put(entry)
+                            self.speech_queue.task_done()
+                            break
+                        batch.append(entry)
                     
-                    if speech_item is None:  # 退出信号
-                        break
+                    # 新的一批开始时清除上一次的停止信号
+                    self._playback_stop.clear()
                     
-                    # 执行语音合成
-                    self._process_speech_item(speech_item)
-                    
-                    self.speech_queue.task_done()
+                    for index, (_, _, speech_item) in enumerate(batch):
+                        self._batch_remaining = len(batch) - index - 1
+                        
+                        if speech_item is None:  # 退出信号
+                            return
+                        
+                        # 执行语音合成，stop_speaking 之后同批剩余的语音不再播放
+                        try:
+                            if not self._playback_stop.is_set():
+                                self._process_speech_item(speech_item)
+                        finally:
+                            self.speech_queue.task_done()
                     
                 except queue.Empty:
                     continue
@@ -139,12 +249,18 @@ class VoiceSynthesis:
             synthesis_func = self.tts_services[service]
             audio_data = synthesis_func(text, voice_style)
             
-            if audio_data:
+            if self._playback_stop.is_set():
+                # 合成期间已被停止，释放尚未读取的流式响应
+                if hasattr(audio_data, 'close'):
+                    audio_data.close()
+            elif audio_data:
                 # 播放音频
                 self._play_audio(audio_data, service)
             else:
                 logger.warning(f"语音合成失败，使用本地TTS: {text[:30]}...")
-                self._synthesize_with_local(text, voice_style)
+                audio_data = self._synthesize_with_local(text, voice_style)
+                if audio_data:
+                    self._play_audio(audio_data, 'local')
             
         except Exception as e:
             logger.error(f"语音合成处理失败: {e}")
@@ -173,8 +289,8 @@ class VoiceSynthesis:
         
         return base_style
     
-    def _synthesize_with_openai(self, text: str, voice_style: Dict) -> Optional[bytes]:
-        """使用OpenAI TTS合成语音"""
+    def _synthesize_with_openai(self, text: str, voice_style: Dict) -> Optional[Iterator[bytes]]:
+        """使用OpenAI TTS合成语音，返回PCM数据块迭代器"""
         try:
             api_key = getattr(settings.ai, 'openai_api_key', '')
             if not api_key:
@@ -192,13 +308,14 @@ class VoiceSynthesis:
                 'model': 'tts-1',
                 'input': text,
                 'voice': 'nova',  # 选择声音
-                'speed': voice_style.get('speed', 1.0)
+                'speed': voice_style.get('speed', 1.0),
+                'response_format': 'pcm'
             }
             
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = self.http.post(url, headers=headers, data=_json_body(payload), timeout=30, stream=True)
             response.raise_for_status()
             
-            return response.content
+            return _stream_chunks(response)
             
         except Exception as e:
             logger.error(f"OpenAI TTS失败: {e}")
@@ -213,6 +330,13 @@ class VoiceSynthesis:
             if not api_key:
                 return None
             
+            ssml = self._build_azure_ssml(text, voice_style)
+            
+            # 优先使用预热的SDK合成器
+            audio_data = self._synthesize_with_azure_pool(ssml)
+            if audio_data:
+                return audio_data
+            
             url = f"https://{region}.tts.speech.microsoft.com/cognitiveservices/v1"
             
             headers = {
@@ -221,21 +345,7 @@ class VoiceSynthesis:
                 'X-Microsoft-OutputFormat': 'riff-24khz-16bit-mono-pcm'
             }
             
-            # SSML格式
-            ssml = f"""
-            <speak version='1.0' xml:lang='{voice_style.get('language', 'zh-CN')}'>
-                <voice xml:lang='{voice_style.get('language', 'zh-CN')}' 
-                       name='zh-CN-XiaoxiaoNeural'
-                       style='{voice_style.get('style', 'friendly')}'>
-                    <prosody rate='{voice_style.get('speed', 1.0)}' 
-                             pitch='{voice_style.get('pitch', 1.0)}'>
-                        {text}
-                    </prosody>
-                </voice>
-            </speak>
-            """
-            
-            response = requests.post(url, headers=headers, data=ssml.encode('utf-8'), timeout=30)
+            response = self.http.post(url, headers=headers, data=ssml.encode('utf-8'), timeout=30)
             response.raise_for_status()
             
             return response.content
@@ -244,8 +354,92 @@ class VoiceSynthesis:
             logger.error(f"Azure TTS失败: {e}")
             return None
     
-    def _synthesize_with_elevenlabs(self, text: str, voice_style: Dict) -> Optional[bytes]:
-        """使用ElevenLabs合成语音"""
+    def _build_azure_ssml(self, text: str, voice_style: Dict) -> str:
+        """构建Azure SSML，文本经XML转义后套入该语音风格预先渲染的前后缀"""
+        prefix, suffix = self._get_azure_ssml_parts(voice_style)
+        return prefix + xml_escape(text) + suffix
+    
+    def _get_azure_ssml_parts(self, voice_style: Dict) -> Tuple[str, str]:
+        """获取某种语音风格的SSML前后缀，每种风格只渲染一次"""
+        language = voice_style.get('language', 'zh-CN')
+        style = voice_style.get('style', 'friendly')
+        speed = voice_style.get('speed', 1.0)
+        pitch = voice_style.get('pitch', 1.0)
+        key = (language, style, speed, pitch)
+        
+        parts = self._azure_ssml_parts.get(key)
+        if parts is None:
+            prefix = (f"<speak version='1.0' xml:lang='{language}'>"
+                      f"<voice xml:lang='{language}' name='zh-CN-XiaoxiaoNeural' style='{style}'>"
+                      f"<prosody rate='{speed}' pitch='{pitch}'>")
+            suffix = "</prosody></voice></speak>"
+            parts = (prefix, suffix)
+            self._azure_ssml_parts[key] = parts
+        return parts
+    
+    def _prewarm_azure_pool(self):
+        """在后台创建并连接Azure合成器"""
+        if speechsdk is None or not getattr(settings.ai, 'azure_speech_key', ''):
+            return
+        
+        def prewarm():
+            for _ in range(self._azure_pool_size):
+                self._add_azure_synthesizer()
+            logger.info(f"Azure合成器已预热: {self._azure_pool.qsize()}个")
+        
+        threading.Thread(target=prewarm, daemon=True).start()
+    
+    def _add_azure_synthesizer(self):
+        """创建一个已建立连接的Azure合成器并放入池中"""
+        try:
+            speech_config = speechsdk.SpeechConfig(
+                subscription=getattr(settings.ai, 'azure_speech_key', ''),
+                region=getattr(settings.ai, 'azure_speech_region', 'eastus')
+            )
+            speech_config.set_speech_synthesis_output_format(
+                speechsdk.SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm
+            )
+            synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+            speechsdk.Connection.from_speech_synthesizer(synthesizer).open(True)
+            
+            # 过期时间加随机抖动，避免所有连接同时重建
+            expires_at = time.monotonic() + self._azure_max_age * random.uniform(0.8, 1.0)
+            self._azure_pool.put((synthesizer, expires_at))
+        except Exception as e:
+            logger.warning(f"Azure合成器预热失败: {e}")
+    
+    def _replace_azure_synthesizer(self):
+        """后台补充一个新的合成器"""
+        threading.Thread(target=self._add_azure_synthesizer, daemon=True).start()
+    
+    def _synthesize_with_azure_pool(self, ssml: str) -> Optional[bytes]:
+        """使用池中的合成器合成语音，池不可用时返回None"""
+        if speechsdk is None:
+            return None
+        
+        try:
+            synthesizer, expires_at = self._azure_pool.get_nowait()
+        except queue.Empty:
+            return None
+        
+        try:
+            result = synthesizer.speak_ssml_async(ssml).get()
+            if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+                raise RuntimeError(f"合成未完成: {result.reason}")
+        except Exception as e:
+            logger.warning(f"Azure合成器失败，将重建: {e}")
+            self._replace_azure_synthesizer()
+            return None
+        
+        if time.monotonic() < expires_at:
+            self._azure_pool.put((synthesizer, expires_at))
+        else:
+            self._replace_azure_synthesizer()
+        
+        return result.audio_data
+    
+    def _synthesize_with_elevenlabs(self, text: str, voice_style: Dict) -> Optional[Iterator[bytes]]:
+        """使用ElevenLabs合成语音，返回PCM数据块迭代器"""
         try:
             api_key = getattr(settings.ai, 'elevenlabs_api_key', '')
             if not api_key:
@@ -253,10 +447,10 @@ class VoiceSynthesis:
             
             voice_id = voice_style.get('voice_id', 'pNInz6obpgDQGcFmaJgB')  # 默认声音ID
             
-            url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+            url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream?output_format=pcm_{PCM_SAMPLE_RATE}"
             
             headers = {
-                'Accept': 'audio/mpeg',
+                'Accept': 'audio/pcm',
                 'Content-Type': 'application/json',
                 'xi-api-key': api_key
             }
@@ -272,10 +466,10 @@ class VoiceSynthesis:
                 }
             }
             
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = self.http.post(url, headers=headers, data=_json_body(payload), timeout=30, stream=True)
             response.raise_for_status()
             
-            return response.content
+            return _stream_chunks(response)
             
         except Exception as e:
             logger.error(f"ElevenLabs TTS失败: {e}")
@@ -283,86 +477,262 @@ class VoiceSynthesis:
     
     def _synthesize_with_local(self, text: str, voice_style: Dict) -> Optional[bytes]:
         """使用本地TTS引擎"""
+        try:
+            engine = self._get_local_engine()
+            if engine is None:
+                logger.warning("本地TTS引擎不可用")
+                return None
+            
+            with self._pyttsx_lock:
+                # 设置语音参数
+                engine.setProperty('rate', int(200 * voice_style.get('speed', 1.0)))
+                engine.setProperty('volume', voice_style.get('volume', 0.8))
+                
+                # 保存音频文件
+                engine.save_to_file(text, self._local_tts_path)
+                engine.runAndWait()
+                
+                # 读取音频数据
+                with open(self._local_tts_path, 'rb') as f:
+                    audio_data = f.read()
+                
+                # 清理临时文件
+                os.unlink(self._local_tts_path)
+            
+            return audio_data
+            
+        except Exception as e:
+            logger.error(f"本地TTS失败: {e}")
+            return None
+    
+    def _get_local_engine(self):
+        """取当前线程的本地TTS引擎，首次使用时在该线程中初始化，失败后不再重试"""
+        local = self._pyttsx_local
+        if hasattr(local, 'engine'):
+            return local.engine
+        
+        local.engine = None
         try:
             if pyttsx3 is None:
                 logger.warning("pyttsx3未安装，无法使用本地TTS")
                 return None
             
             engine = pyttsx3.init()
-            
-            # 设置语音参数
-            engine.setProperty('rate', int(200 * voice_style.get('speed', 1.0)))
-            engine.setProperty('volume', voice_style.get('volume', 0.8))
+            voices = engine.getProperty('voices') or []
             
             # 尝试设置中文语音
-            voices = engine.getProperty('voices')
             for voice in voices:
                 if 'chinese' in voice.name.lower() or 'zh' in voice.id.lower():
                     engine.setProperty('voice', voice.id)
                     break
             
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_path = temp_file.name
-            
-            # 保存音频文件
-            engine.save_to_file(text, temp_path)
-            engine.runAndWait()
-            
-            # 读取音频数据
-            with open(temp_path, 'rb') as f:
-                audio_data = f.read()
-            
-            # 清理临时文件
-            os.unlink(temp_path)
-            
-            return audio_data
-            
-        except Exception as e:
-            logger.error(f"本地TTS失败: {e}")
-            return None
-    
-    def _init_local_tts(self):
-        """初始化本地TTS引擎"""
-        try:
-            if pyttsx3 is not None:
-                # 测试本地TTS引擎
-                engine = pyttsx3.init()
-                voices = engine.getProperty('voices')
-                logger.info(f"本地TTS引擎初始化成功，可用语音数: {len(voices) if voices else 0}")
+            local.engine = engine
+            logger.info(f"本地TTS引擎初始化成功，可用语音数: {len(voices)}")
         except Exception as e:
             logger.warning(f"本地TTS引擎初始化失败: {e}")
+        return local.engine
     
-    def _play_audio(self, audio_data: bytes, service: str):
-        """播放音频数据"""
+    def _play_audio(self, audio_data: Union[bytes, Iterator[bytes]], service: str):
+        """播放音频数据（WAV字节或流式PCM数据块）"""
         try:
             if pygame is None:
                 logger.warning("pygame未安装，无法播放音频")
                 return
             
-            # 使用pygame播放音频
-            audio_file = io.BytesIO(audio_data)
+            if not isinstance(audio_data, (bytes, bytearray)):
+                # 流式PCM，边下载边播放
+                self._play_pcm_stream(audio_data)
+                return
             
-            if service in ['openai', 'elevenlabs']:
-                # MP3格式
-                pygame.mixer.music.load(audio_file)
-                pygame.mixer.music.play()
-                
-                # 等待播放完成
-                while pygame.mixer.music.get_busy():
-                    pygame.time.wait(100)
-            else:
-                # WAV格式
-                sound = pygame.mixer.Sound(audio_file)
-                sound.play()
-                
-                # 等待播放完成
-                while pygame.mixer.get_busy():
-                    pygame.time.wait(100)
+            # WAV格式，转换为流式PCM的格式后走同一播放路径
+            pcm = self._wav_to_pcm(audio_data)
+            if pcm is not None:
+                self._play_pcm_stream(iter((pcm,)))
+                return
+            
+            # 其他格式交给pygame解码后直接播放，按时长等待播放完成，stop_speaking可随时打断
+            sound = pygame.mixer.Sound(io.BytesIO(audio_data))
+            channel = sound.play()
+            if channel is None or self._playback_stop.wait(sound.get_length()):
+                return
+            while channel.get_busy() and not self._playback_stop.wait(PLAYBACK_POLL_INTERVAL):
+                pass
             
         except Exception as e:
             logger.error(f"音频播放失败: {e}")
     
+    def _wav_to_pcm(self, audio_data: bytes) -> Optional[bytes]:
+        """把16位WAV转换为24kHz单声道PCM，无法转换时返回None"""
+        try:
+            with wave.open(io.BytesIO(audio_data), 'rb') as wav:
+                if wav.getsampwidth() != 2:
+                    return None
+                rate = wav.getframerate()
+                channels = wav.getnchannels()
+                frames = wav.readframes(wav.getnframes())
+        except (wave.Error, EOFError):
+            return None
+        
+        if rate == PCM_SAMPLE_RATE and channels == 1:
+            return frames
+        if np is None:
+            return None
+        
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32)
+        if channels > 1:
+            samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+        samples = _resample(samples, rate, PCM_SAMPLE_RATE)
+        return np.clip(samples, -32768, 32767).astype(np.int16).tobytes()
+    
+    def _to_mixer_format(self, data: bytes) -> bytes:
+        """把24kHz单声道16位PCM转换为混音器当前的采样率、位宽和声道数"""
+        mixer_format = pygame.mixer.get_init()
+        if not mixer_format or mixer_format == (PCM_SAMPLE_RATE, -16, 1) or np is None or not data:
+            return data
+        
+        frequency, size, channels = mixer_format
+        samples = _resample(np.frombuffer(data, dtype=np.int16).astype(np.float32),
+                            PCM_SAMPLE_RATE, frequency)
+        samples = np.clip(samples, -32768, 32767)
+        
+        if size == -16:
+            out = samples.astype(np.int16)
+        elif size == 16:
+            out = (samples + 32768).astype(np.uint16)
+        elif size == 32:
+            out = (samples / 32768).astype(np.float32)
+        elif size == 8:
+            out = (samples / 256 + 128).astype(np.uint8)
+        elif size == -8:
+            out = (samples / 256).astype(np.int8)
+        else:
+            logger.warning(f"不支持的混音器位宽: {size}")
+            return data
+        
+        if channels > 1:
+            out = np.repeat(out, channels)
+        return out.tobytes()
+    
+    def _play_pcm_stream(self, chunks: Iterator[bytes]):
+        """将网络上到达的PCM数据块依次排入混音通道播放，stop_speaking 可随时打断"""
+        try:
+            self._stream_to_channel(chunks)
+        finally:
+            # 提前结束时关闭流式响应，不再继续下载
+            if hasattr(chunks, 'close'):
+                chunks.close()
+    
+    def _stream_to_channel(self, chunks: Iterator[bytes]):
+        """边接收边播放PCM数据块，被停止时返回"""
+        channel = pygame.mixer.find_channel(True)
+        stop = self._playback_stop
+        buffer = bytearray()
+        started = False
+        first_block = True
+        # 已排入通道的音频预计播完的时刻，以及排队中的声音预计开始播放的时刻
+        play_end = time.monotonic()
+        queued_start = play_end
+        # 始终保留结尾的若干采样，用于与下一段交叉淡化
+        tail_bytes = BLEND_SAMPLES * 2
+        
+        def enqueue(data: bytes) -> bool:
+            """排入一段PCM，已被停止时返回False"""
+            nonlocal started, play_end, queued_start
+            duration = len(data) / (2 * PCM_SAMPLE_RATE)
+            sound = pygame.mixer.Sound(buffer=self._to_mixer_format(data))
+            if not started:
+                if stop.is_set():
+                    return False
+                channel.play(sound)
+                started = True
+                play_end = time.monotonic() + duration
+                return True
+            # 通道只能排队一个声音，先按时长等到排队中的声音开始播放，再以较粗的间隔确认
+            if channel.get_queue() is not None:
+                if stop.wait(max(0.0, queued_start - time.monotonic())):
+                    return False
+                while channel.get_queue() is not None:
+                    if stop.wait(PLAYBACK_POLL_INTERVAL):
+                        return False
+            # 停止后通道空闲，此时排入会重新开始播放
+            if stop.is_set():
+                return False
+            channel.queue(sound)
+            queued_start = max(play_end, time.monotonic())
+            play_end = queued_start + duration
+            return True
+        
+        for chunk in chunks:
+            if stop.is_set():
+                return
+            buffer.extend(chunk)
+            if len(buffer) >= PCM_PLAY_BYTES + tail_bytes:
+                # 按16位采样对齐切分
+                size = len(buffer) - tail_bytes
+                size -= size % 2
+                data = bytes(buffer[:size])
+                if first_block:
+                    data = self._blend_head(data)
+                    first_block = False
+                if not enqueue(data):
+                    return
+                del buffer[:size]
+        
+        if stop.is_set():
+            return
+        data = bytes(buffer[:len(buffer) - (len(buffer) % 2)])
+        if first_block:
+            data = self._blend_head(data)
+        data = self._finish_tail(data)
+        if data and not enqueue(data):
+            return
+        
+        # 按已排入的时长一次性等待播放完成，stop_speaking可随时打断
+        if stop.wait(max(0.0, play_end - time.monotonic())):
+            return
+        # 混音器时钟略有偏差时补上最后一点
+        while channel.get_busy() and not stop.wait(PLAYBACK_POLL_INTERVAL):
+            pass
+    
+    def _blend_head(self, data: bytes) -> bytes:
+        """将上一段保留的结尾与本段开头做Hann窗交叉淡化，没有可用结尾时淡入"""
+        if np is None or len(data) < 2:
+            return data
+        
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+        n = min(BLEND_SAMPLES, len(samples))
+        t = np.linspace(0.0, 1.0, n, dtype=np.float32)
+        fade_in = 0.5 * (1 - np.cos(np.pi * t))
+        fade_out = 0.5 * (1 + np.cos(np.pi * t))
+        
+        tail = self._pending_tail
+        self._pending_tail = None
+        if tail is not None and time.monotonic() - self._pending_tail_time < BLEND_TAIL_TTL:
+            tail = tail[-n:] if len(tail) >= n else np.pad(tail, (n - len(tail), 0))
+            samples[:n] = tail * fade_out + samples[:n] * fade_in
+        else:
+            samples[:n] *= fade_in
+        
+        return np.clip(samples, -32768, 32767).astype(np.int16).tobytes()
+    
+    def _finish_tail(self, data: bytes) -> bytes:
+        """处理本段结尾：后面还有语音时保留结尾用于交叉淡化，否则淡出"""
+        if np is None or len(data) < 2:
+            return data
+        
+        samples = np.frombuffer(data, dtype=np.int16)
+        n = min(BLEND_SAMPLES, len(samples))
+        
+        if self._batch_remaining > 0 or not self.speech_queue.empty():
+            self._pending_tail = samples[-n:].astype(np.float32)
+            self._pending_tail_time = time.monotonic()
+            return data[:-n * 2]
+        
+        samples = samples.astype(np.float32)
+        t = np.linspace(0.0, 1.0, n, dtype=np.float32)
+        samples[-n:] *= 0.5 * (1 + np.cos(np.pi * t))
+        return samples.astype(np.int16).tobytes()
+    
     def set_voice_config(self, **kwargs):
         """设置语音配置"""
         self.voice_config.update(kwargs)
@@ -371,6 +741,7 @@ class VoiceSynthesis:
     def stop_speaking(self):
         """停止当前语音"""
         try:
+            self._playback_stop.set()
             if pygame:
                 pygame.mixer.music.stop()
                 pygame.mixer.stop()
@@ -422,11 +793,12 @@ class VoiceSynthesis:
         self.stop_speaking()
         
         # 发送退出信号
-        self.speech_queue.put(None)
+        self.speech_queue.put((SHUTDOWN_PRIORITY, next(self._speech_seq), None))
         
         if self.speech_thread and self.speech_thread.is_alive():
             self.speech_thread.join(timeout=2)
         
+        self.http.close()
         logger.info("语音合成系统已关闭")
 
 # 全局语音合成实例
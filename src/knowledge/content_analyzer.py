@@ -4,20 +4,78 @@
 import logging
 import re
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 from urllib.parse import urljoin, urlparse
 import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from bs4 import BeautifulSoup
 except ImportError:
     BeautifulSoup = None
 
+try:
+    # lexbor 后端的C解析器，提取正文比BeautifulSoup快得多
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    # Aho-Corasick 自动机，一次扫描匹配全部关键词
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# 网页抓取：分块读取，最多读取的字节数及可提前结束的结束标签
+FETCH_CHUNK_SIZE = 8192
+FETCH_MAX_BYTES = 64 * 1024
+FETCH_STOP_TAGS = (b'</article>', b'</main>')
+FETCH_MAX_WORKERS = 8
+
+# 摘要中使用的类别名称
+CATEGORY_NAMES = {
+    'technology': '科技',
+    'science': '科学',
+    'entertainment': '娱乐',
+    'news': '新闻',
+    'learning': '学习',
+    'general': '一般'
+}
+
+class _Ctx:
+    """一段待分析的文本：小写形式和关键词命中各只计算一次"""
+    __slots__ = ('raw', '_lower', 'hits')
+    
+    def __init__(self, raw: str):
+        self.raw = raw
+        self._lower = None
+        self.hits = None
+    
+    @property
+    def lower(self) -> str:
+        if self._lower is None:
+            self._lower = self.raw.lower()
+        return self._lower
+
 class ContentAnalyzer:
     """内容分析器 - 分析网页内容、提取关键信息"""
     
@@ -26,10 +84,28 @@ class ContentAnalyzer:
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
-        # 分析历史
-        self.analysis_history = []
+        # 分析历史（列式环形缓冲区）
         self.max_history = 100
+        self._hist_head = 0
+        self._hist_len = 0
+        if np is not None:
+            self._hist_interesting = np.zeros(self.max_history, dtype=np.int32)
+            self._hist_category = np.empty(self.max_history, dtype='U16')
+            self._hist_time = np.empty(self.max_history, dtype='datetime64[ms]')
+        else:
+            self._hist_interesting = [0] * self.max_history
+            self._hist_category = [''] * self.max_history
+            self._hist_time = [None] * self.max_history
+        
+        # 关键词扫描结果缓存（同一批搜索结果常被反复分析）
+        self._scan_cache = OrderedDict()
+        self._scan_cache_size = 4096
+        self._scan_cache_max_text = 2048
+        self._scan_cache_lock = threading.Lock()
         
         # 关键词库
         self.interest_keywords = {
@@ -46,6 +122,175 @@ class ContentAnalyzer:
             'negative': ['坏', '糟糕', '失败', '问题', '错误', '危险'],
             'neutral': ['一般', '普通', '正常', '平常', '标准']
         }
+        
+        # 有趣内容的特征
+        self.interesting_indicators = [
+            '新发现', '突破', '创新', '惊人', '首次', '神奇',
+            'breakthrough', 'amazing', 'incredible', 'discovery',
+            '史上首次', '世界首个', '重大进展'
+        ]
+        
+        # 预编译的正则和小写关键词表
+        self._ws_re = re.compile(r'\s+')
+        self._proper_noun_re = re.compile(r'\b[A-Z][a-z]+\b')
+        self._build_keyword_index()
+    
+    def _build_keyword_index(self):
+        """预先构建小写关键词表和关键词扫描器"""
+        self._cat_kw_lower = {
+            category: [keyword.lower() for keyword in keywords]
+            for category, keywords in self.interest_keywords.items()
+        }
+        self._topic_kw = [
+            (keyword, keyword.lower())
+            for keywords in self.interest_keywords.values()
+            for keyword in keywords
+        ]
+        self._indicators_lower = [indicator.lower() for indicator in self.interesting_indicators]
+        
+        # 情感词原本按原样匹配（不转小写）
+        all_keywords = set(kw for _, kw in self._topic_kw)
+        all_keywords.update(kw for kws in self.emotion_keywords.values() for kw in kws)
+        all_keywords.update(self._indicators_lower)
+        self._all_keywords = sorted(all_keywords)
+        
+        # 关键词 -> 类别/情感 的计分矩阵，批量打分时一次矩阵乘法得到全部得分
+        self._categories = list(self.interest_keywords)
+        self._sentiments = list(self.emotion_keywords)
+        self._kw_index = {keyword: i for i, keyword in enumerate(self._all_keywords)}
+        self._cat_mask = None
+        self._sent_mask = None
+        if np is not None:
+            self._cat_mask = np.zeros((len(self._all_keywords), len(self._categories)), dtype=np.int32)
+            for j, category in enumerate(self._categories):
+                for keyword in self._cat_kw_lower[category]:
+                    self._cat_mask[self._kw_index[keyword], j] += 1
+            self._sent_mask = np.zeros((len(self._all_keywords), len(self._sentiments)), dtype=np.int32)
+            for j, sentiment in enumerate(self._sentiments):
+                for keyword in self.emotion_keywords[sentiment]:
+                    self._sent_mask[self._kw_index[keyword], j] += 1
+        
+        # 无 pyahocorasick 时的回退：所有关键词合成一个正则，一次线性扫描。
+        # 前瞻分组使重叠的关键词也能命中；同一位置只会匹配最长的关键词，
+        # 以它为前缀的较短关键词通过 _kw_prefixes 补上
+        by_length = sorted(self._all_keywords, key=len, reverse=True)
+        self._kw_scan_re = re.compile('(?=(' + '|'.join(re.escape(keyword) for keyword in by_length) + '))')
+        self._kw_prefixes = {}
+        for keyword in self._all_keywords:
+            prefixes = [other for other in self._all_keywords if other != keyword and keyword.startswith(other)]
+            if prefixes:
+                self._kw_prefixes[keyword] = prefixes
+        
+        self._automaton = None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for keyword in self._all_keywords:
+                automaton.add_word(keyword, keyword)
+            automaton.make_automaton()
+            self._automaton = automaton
+    
+    def _scan_keywords(self, content_lower: str) -> set:
+        """扫描一次文本，返回其中出现的所有关键词"""
+        if self._automaton is not None:
+            return {keyword for _, keyword in self._automaton.iter(content_lower)}
+        hits = set(self._kw_scan_re.findall(content_lower))
+        for keyword in [keyword for keyword in hits if keyword in self._kw_prefixes]:
+            hits.update(self._kw_prefixes[keyword])
+        return hits
+    
+    def _cached_scan(self, ctx: _Ctx) -> frozenset:
+        """带LRU缓存的关键词扫描，以原文为键"""
+        content = ctx.raw
+        if len(content) > self._scan_cache_max_text:
+            # 网页正文这类长文本很少重复，不占用缓存
+            return frozenset(self._scan_keywords(ctx.lower))
+        
+        with self._scan_cache_lock:
+            hits = self._scan_cache.get(content)
+            if hits is not None:
+                self._scan_cache.move_to_end(content)
+                return hits
+        
+        hits = frozenset(self._scan_keywords(ctx.lower))
+        
+        with self._scan_cache_lock:
+            self._scan_cache[content] = hits
+            if len(self._scan_cache) > self._scan_cache_size:
+                self._scan_cache.popitem(last=False)
+        return hits
+    
+    def _hits(self, ctx: _Ctx) -> frozenset:
+        """文本中出现的关键词，同一文本只扫描一次"""
+        if ctx.hits is None:
+            ctx.hits = self._cached_scan(ctx)
+        return ctx.hits
+    
+    def _category_from_hits(self, hits: set) -> str:
+        """根据命中的关键词分类"""
+        category_scores = {
+            category: sum(1 for keyword in keywords if keyword in hits)
+            for category, keywords in self._cat_kw_lower.items()
+        }
+        
+        # 返回得分最高的类别
+        if category_scores:
+            return max(category_scores, key=category_scores.get)
+        else:
+            return 'general'
+    
+    def _sentiment_from_hits(self, hits: set) -> str:
+        """根据命中的关键词判断情感"""
+        sentiment_scores = {
+            sentiment: sum(1 for keyword in keywords if keyword in hits)
+            for sentiment, keywords in self.emotion_keywords.items()
+        }
+        
+        # 返回得分最高的情感
+        if sentiment_scores:
+            max_sentiment = max(sentiment_scores, key=sentiment_scores.get)
+            return max_sentiment if sentiment_scores[max_sentiment] > 0 else 'neutral'
+        else:
+            return 'neutral'
+    
+    def _topics_from_hits(self, hits: set, content: str) -> List[str]:
+        """根据命中的关键词和专有名词提取主题"""
+        topics = [keyword for keyword, keyword_lower in self._topic_kw if keyword_lower in hits]
+        
+        # 使用正则表达式提取可能的专有名词
+        proper_nouns = self._proper_noun_re.findall(content)
+        topics.extend(proper_nouns[:5])  # 最多5个专有名词
+        
+        return list(dict.fromkeys(topics))[:10]  # 保序去重并限制数量
+    
+    def _indicator_matrix(self, hit_sets: List[set]):
+        """把每条文本的命中集合转成 (N, K) 指示矩阵"""
+        rows = [i for i, hits in enumerate(hit_sets) for _ in hits]
+        cols = [self._kw_index[keyword] for hits in hit_sets for keyword in hits]
+        matrix = np.zeros((len(hit_sets), len(self._all_keywords)), dtype=np.int32)
+        # 一次花式索引赋值填满所有命中位置
+        matrix[rows, cols] = 1
+        return matrix
+    
+    def _score_batch(self, hit_sets: List[set], snippet_hit_sets: List[set]) -> Tuple[List[str], List[str]]:
+        """批量计算类别和情感，结果与逐条调用 _category_from_hits/_sentiment_from_hits 一致"""
+        if np is None or not hit_sets:
+            return ([self._category_from_hits(hits) for hits in hit_sets],
+                    [self._sentiment_from_hits(hits) for hits in snippet_hit_sets])
+        
+        # argmax 取第一个最大值，与 max() 按字典顺序的取舍相同
+        cat_scores = self._indicator_matrix(hit_sets) @ self._cat_mask
+        categories = [self._categories[j] for j in cat_scores.argmax(axis=1)]
+        
+        sent_scores = self._indicator_matrix(snippet_hit_sets) @ self._sent_mask
+        best = sent_scores.argmax(axis=1)
+        has_sentiment = sent_scores[np.arange(len(best)), best] > 0
+        sentiments = [self._sentiments[j] if ok else 'neutral' for j, ok in zip(best, has_sentiment)]
+        
+        return categories, sentiments
+    
+    def _interesting_from_hits(self, hits: set) -> bool:
+        """根据命中的关键词判断是否有趣"""
+        return any(indicator in hits for indicator in self._indicators_lower)
     
     def analyze_search_results(self, search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """分析搜索结果"""
@@ -63,32 +308,42 @@ class ContentAnalyzer:
                 'summary': ''
             }
             
-            # 分析每个结果
+            # 标题和摘要各扫描一次（关键词不含空格，拼接后的命中即两者的并集）
+            snippet_hit_sets = []
+            hit_sets = []
             for result in search_results:
-                # 分类分析
-                category = self._categorize_content(result.get('title', '') + ' ' + result.get('snippet', ''))
+                snippet_hits = self._hits(_Ctx(result.get('snippet', '')))
+                snippet_hit_sets.append(snippet_hits)
+                hit_sets.append(self._hits(_Ctx(result.get('title', ''))) | snippet_hits)
+            
+            # 批量计算类别和情感
+            categories, sentiments = self._score_batch(hit_sets, snippet_hit_sets)
+            
+            # 分析每个结果
+            for result, hits, category, sentiment in zip(search_results, hit_sets, categories, sentiments):
                 analysis['categories'][category] = analysis['categories'].get(category, 0) + 1
-                
-                # 情感分析
-                sentiment = self._analyze_sentiment(result.get('snippet', ''))
                 analysis['sentiment'][sentiment] += 1
                 
                 # 提取关键主题
-                topics = self._extract_topics(result.get('title', '') + ' ' + result.get('snippet', ''))
+                topics = self._topics_from_hits(hits, result.get('title', '') + ' ' + result.get('snippet', ''))
                 analysis['key_topics'].extend(topics)
                 
                 # 判断是否有趣
-                if self._is_interesting(result):
+                if self._interesting_from_hits(hits):
                     analysis['interesting_results'].append(result)
             
-            # 去重关键主题
-            analysis['key_topics'] = list(set(analysis['key_topics']))[:10]
+            # 保序去重关键主题
+            analysis['key_topics'] = list(dict.fromkeys(analysis['key_topics']))[:10]
+            
+            # 主要类别只计算一次，摘要和历史记录共用
+            categories = analysis['categories']
+            main_category = max(categories, key=categories.get) if categories else None
             
             # 生成摘要
-            analysis['summary'] = self._generate_summary(analysis)
+            analysis['summary'] = self._generate_summary(analysis, main_category)
             
             # 记录分析历史
-            self._record_analysis(analysis)
+            self._record_analysis(analysis, main_category)
             
             return {'status': 'success', 'analysis': analysis}
             
@@ -99,25 +354,17 @@ class ContentAnalyzer:
     def analyze_webpage(self, url: str) -> Dict[str, Any]:
         """分析网页内容"""
         try:
-            # 获取网页内容
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            if BeautifulSoup is None:
-                return {'status': 'error', 'message': 'BeautifulSoup不可用'}
+            if LexborHTMLParser is None and BeautifulSoup is None:
+                return {'status': 'error', 'message': 'HTML解析器不可用'}
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 提取基本信息
-            title = soup.find('title')
-            title_text = title.get_text(strip=True) if title else ''
+            # 获取网页内容
+            html, encoding = self._fetch_html(url)
             
-            # 提取正文内容
-            content = self._extract_main_content(soup)
+            # 解析标题、描述和正文
+            title_text, description, content = self._parse_html(html, encoding)
             
-            # 提取元数据
-            meta_description = soup.find('meta', attrs={'name': 'description'})
-            description = meta_description.get('content', '') if meta_description else ''
+            title_ctx = _Ctx(title_text)
+            content_ctx = _Ctx(content)
             
             # 分析内容
             analysis = {
@@ -126,9 +373,9 @@ class ContentAnalyzer:
                 'description': description,
                 'content_length': len(content),
                 'main_content': content[:1000] + '...' if len(content) > 1000 else content,
-                'category': self._categorize_content(title_text + ' ' + content),
-                'sentiment': self._analyze_sentiment(content),
-                'key_topics': self._extract_topics(content),
+                'category': self._category_from_hits(self._hits(title_ctx) | self._hits(content_ctx)),
+                'sentiment': self._analyze_sentiment(content_ctx),
+                'key_topics': self._extract_topics(content_ctx),
                 'timestamp': datetime.now()
             }
             
@@ -138,74 +385,105 @@ class ContentAnalyzer:
             logger.error(f"网页分析失败 {url}: {e}")
             return {'status': 'error', 'message': str(e)}
     
-    def _categorize_content(self, content: str) -> str:
-        """内容分类"""
-        content_lower = content.lower()
-        
-        # 计算每个类别的匹配度
-        category_scores = {}
-        for category, keywords in self.interest_keywords.items():
-            score = sum(1 for keyword in keywords if keyword.lower() in content_lower)
-            category_scores[category] = score
+    def analyze_webpages(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """并发分析多个网页，结果顺序与urls一致"""
+        if not urls:
+            return []
         
-        # 返回得分最高的类别
-        if category_scores:
-            return max(category_scores, key=category_scores.get)
-        else:
-            return 'general'
+        # 共用带连接池的session，握手和下载在线程间重叠
+        with ThreadPoolExecutor(max_workers=min(FETCH_MAX_WORKERS, len(urls))) as executor:
+            return list(executor.map(self.analyze_webpage, urls))
     
-    def _analyze_sentiment(self, content: str) -> str:
-        """情感分析"""
-        content_lower = content.lower()
+    def _fetch_html(self, url: str) -> Tuple[bytes, Optional[str]]:
+        """分块下载网页，读到正文结束标签或达到上限后提前停止"""
+        chunks = []
+        total = 0
+        tail = b''
         
-        # 计算情感词汇出现次数
-        sentiment_scores = {}
-        for sentiment, keywords in self.emotion_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in content_lower)
-            sentiment_scores[sentiment] = score
+        with self.session.get(url, stream=True, timeout=10) as response:
+            response.raise_for_status()
+            
+            # 只信任响应头里明确声明的编码，否则交给解析器从meta里识别
+            content_type = response.headers.get('content-type', '').lower()
+            encoding = response.encoding if 'charset' in content_type else None
+            
+            for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+                chunks.append(chunk)
+                total += len(chunk)
+                
+                # 带上一块的末尾，避免结束标签被切在两块之间
+                window = (tail + chunk).lower()
+                if total >= FETCH_MAX_BYTES or any(tag in window for tag in FETCH_STOP_TAGS):
+                    break
+                tail = chunk[-16:]
         
-        # 返回得分最高的情感
-        if sentiment_scores:
-            max_sentiment = max(sentiment_scores, key=sentiment_scores.get)
-            return max_sentiment if sentiment_scores[max_sentiment] > 0 else 'neutral'
-        else:
-            return 'neutral'
+        return b''.join(chunks), encoding
+    
+    def _categorize_content(self, ctx: _Ctx) -> str:
+        """内容分类"""
+        return self._category_from_hits(self._hits(ctx))
+    
+    def _analyze_sentiment(self, ctx: _Ctx) -> str:
+        """情感分析"""
+        return self._sentiment_from_hits(self._hits(ctx))
     
-    def _extract_topics(self, content: str) -> List[str]:
+    def _extract_topics(self, ctx: _Ctx) -> List[str]:
         """提取关键主题"""
-        # 简单的关键词提取
-        topics = []
+        return self._topics_from_hits(self._hits(ctx), ctx.raw)
+    
+    def _is_interesting(self, result: Dict[str, Any]) -> bool:
+        """判断结果是否有趣"""
+        hits = self._hits(_Ctx(result.get('title', ''))) | self._hits(_Ctx(result.get('snippet', '')))
+        return self._interesting_from_hits(hits)
+    
+    def _parse_html(self, html: bytes, encoding: Optional[str]) -> Tuple[str, str, str]:
+        """解析网页，返回 (标题, 描述, 正文)"""
+        if LexborHTMLParser is not None:
+            if encoding:
+                tree = LexborHTMLParser(html.decode(encoding, errors='replace'))
+            else:
+                tree = LexborHTMLParser(html, encoding=True)
+            
+            title = tree.css_first('title')
+            title_text = title.text(strip=True) if title else ''
+            
+            meta_description = tree.css_first('meta[name="description"]')
+            description = (meta_description.attributes.get('content') or '') if meta_description else ''
+            
+            return title_text, description, self._extract_main_text(tree)
         
-        # 提取所有匹配的关键词
-        content_lower = content.lower()
-        for category, keywords in self.interest_keywords.items():
-            for keyword in keywords:
-                if keyword.lower() in content_lower:
-                    topics.append(keyword)
+        soup = BeautifulSoup(html, HTML_PARSER, from_encoding=encoding)
         
-        # 使用正则表达式提取可能的专有名词
-        proper_nouns = re.findall(r'\b[A-Z][a-z]+\b', content)
-        topics.extend(proper_nouns[:5])  # 最多5个专有名词
+        # 提取基本信息
+        title = soup.find('title')
+        title_text = title.get_text(strip=True) if title else ''
+        
+        # 提取元数据
+        meta_description = soup.find('meta', attrs={'name': 'description'})
+        description = meta_description.get('content', '') if meta_description else ''
         
-        return list(set(topics))[:10]  # 去重并限制数量
+        return title_text, description, self._extract_main_content(soup)
     
-    def _is_interesting(self, result: Dict[str, Any]) -> bool:
-        """判断结果是否有趣"""
-        title = result.get('title', '').lower()
-        snippet = result.get('snippet', '').lower()
-        content = title + ' ' + snippet
+    def _extract_main_text(self, tree) -> str:
+        """提取网页主要内容（selectolax）"""
+        # 移除脚本和样式
+        for node in tree.css('script, style'):
+            node.decompose()
         
-        # 有趣内容的特征
-        interesting_indicators = [
-            '新发现', '突破', '创新', '惊人', '首次', '神奇',
-            'breakthrough', 'amazing', 'incredible', 'discovery',
-            '史上首次', '世界首个', '重大进展'
-        ]
+        # 尝试找到主要内容区域
+        main_content = tree.css_first('main') or tree.css_first('article') or tree.css_first('div.content')
+        
+        if main_content:
+            content = main_content.text()
+        else:
+            # 获取所有段落文本
+            content = ' '.join(node.text() for node in tree.css('p'))
         
-        return any(indicator in content for indicator in interesting_indicators)
+        # 清理文本
+        return self._ws_re.sub(' ', content).strip()
     
     def _extract_main_content(self, soup: BeautifulSoup) -> str:
-        """提取网页主要内容"""
+        """提取网页主要内容（BeautifulSoup）"""
         # 移除脚本和样式
         for script in soup(["script", "style"]):
             script.decompose()
@@ -221,11 +499,11 @@ class ContentAnalyzer:
             content = ' '.join([p.get_text() for p in paragraphs])
         
         # 清理文本
-        content = re.sub(r'\s+', ' ', content).strip()
+        content = self._ws_re.sub(' ', content).strip()
         
         return content
     
-    def _generate_summary(self, analysis: Dict[str, Any]) -> str:
+    def _generate_summary(self, analysis: Dict[str, Any], main_category: Optional[str]) -> str:
         """生成分析摘要"""
         summary_parts = []
         
@@ -234,17 +512,8 @@ class ContentAnalyzer:
         summary_parts.append(f"找到{total}个结果")
         
         # 主要类别
-        if analysis['categories']:
-            main_category = max(analysis['categories'], key=analysis['categories'].get)
-            category_names = {
-                'technology': '科技',
-                'science': '科学',
-                'entertainment': '娱乐',
-                'news': '新闻',
-                'learning': '学习',
-                'general': '一般'
-            }
-            summary_parts.append(f"主要是{category_names.get(main_category, main_category)}类内容")
+        if main_category:
+            summary_parts.append(f"主要是{CATEGORY_NAMES.get(main_category, main_category)}类内容")
         
         # 情感倾向
         sentiment = analysis['sentiment']
@@ -262,69 +531,86 @@ class ContentAnalyzer:
         
         return "，".join(summary_parts)
     
-    def _record_analysis(self, analysis: Dict[str, Any]):
+    def _record_analysis(self, analysis: Dict[str, Any], main_category: Optional[str]):
         """记录分析历史"""
-        self.analysis_history.append({
-            'timestamp': analysis['timestamp'],
-            'total_results': analysis['total_results'],
-            'main_category': max(analysis['categories'], key=analysis['categories'].get) if analysis['categories'] else 'unknown',
-            'interesting_count': len(analysis['interesting_results'])
-        })
+        slot = self._hist_head % self.max_history
+        self._hist_interesting[slot] = len(analysis['interesting_results'])
+        self._hist_category[slot] = main_category or 'unknown'
+        self._hist_time[slot] = analysis['timestamp']
         
-        # 保持历史长度
-        if len(self.analysis_history) > self.max_history:
-            self.analysis_history = self.analysis_history[-self.max_history:]
+        self._hist_head += 1
+        self._hist_len = min(self._hist_len + 1, self.max_history)
     
     def get_analysis_trends(self) -> Dict[str, Any]:
         """获取分析趋势"""
-        if not self.analysis_history:
+        n = self._hist_len
+        if not n:
             return {'total_analyses': 0}
         
-        # 统计类别分布
-        category_counts = {}
-        total_interesting = 0
+        last_time = self._hist_time[(self._hist_head - 1) % self.max_history]
         
-        for record in self.analysis_history:
-            category = record['main_category']
-            category_counts[category] = category_counts.get(category, 0) + 1
-            total_interesting += record['interesting_count']
+        # 统计类别分布
+        if np is not None:
+            categories, counts = np.unique(self._hist_category[:n], return_counts=True)
+            category_counts = {str(category): int(count) for category, count in zip(categories, counts)}
+            average_interesting = float(self._hist_interesting[:n].mean())
+            last_time = last_time.astype(datetime)
+        else:
+            category_counts = {}
+            for category in self._hist_category[:n]:
+                category_counts[category] = category_counts.get(category, 0) + 1
+            average_interesting = sum(self._hist_interesting[:n]) / n
         
         return {
-            'total_analyses': len(self.analysis_history),
+            'total_analyses': n,
             'category_distribution': category_counts,
-            'average_interesting_per_analysis': total_interesting / len(self.analysis_history),
-            'last_analysis_time': self.analysis_history[-1]['timestamp']
+            'average_interesting_per_analysis': average_interesting,
+            'last_analysis_time': last_time
         }
     
     def find_related_content(self, topic: str, search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """根据主题找到相关内容"""
-        related_results = []
+        if not search_results:
+            return []
+        
         topic_lower = topic.lower()
         
-        for result in search_results:
-            title = result.get('title', '').lower()
-            snippet = result.get('snippet', '').lower()
-            
-            # 计算相关度得分
-            relevance_score = 0
-            if topic_lower in title:
-                relevance_score += 3
-            if topic_lower in snippet:
-                relevance_score += 2
-            
-            # 检查相关关键词
-            for category, keywords in self.interest_keywords.items():
-                if topic_lower in [kw.lower() for kw in keywords]:
-                    for keyword in keywords:
-                        if keyword.lower() in title or keyword.lower() in snippet:
-                            relevance_score += 1
+        # 主题本身属于哪些类别，这些类别的关键词每命中一个加1分
+        topic_categories = [j for j, category in enumerate(self._categories)
+                            if topic_lower in self._cat_kw_lower[category]]
+        
+        title_ctxs = [_Ctx(result.get('title', '')) for result in search_results]
+        snippet_ctxs = [_Ctx(result.get('snippet', '')) for result in search_results]
+        
+        # 计算相关度得分
+        if np is not None:
+            scores = np.array([3 * (topic_lower in title.lower) + 2 * (topic_lower in snippet.lower)
+                               for title, snippet in zip(title_ctxs, snippet_ctxs)], dtype=np.int32)
+            if topic_categories:
+                weights = self._cat_mask[:, topic_categories].sum(axis=1)
+                hit_sets = [self._hits(title) | self._hits(snippet) for title, snippet in zip(title_ctxs, snippet_ctxs)]
+                scores += self._indicator_matrix(hit_sets) @ weights
             
-            if relevance_score > 0:
-                result_copy = result.copy()
-                result_copy['relevance_score'] = relevance_score
-                related_results.append(result_copy)
+            # 稳定排序，得分相同时保持原顺序
+            order = [i for i in np.argsort(-scores, kind='stable') if scores[i] > 0][:5]
+            ranked = [(search_results[i], int(scores[i])) for i in order]
+        else:
+            topic_keywords = [keyword for j in topic_categories for keyword in self._cat_kw_lower[self._categories[j]]]
+            ranked = []
+            for result, title, snippet in zip(search_results, title_ctxs, snippet_ctxs):
+                score = 3 * (topic_lower in title.lower) + 2 * (topic_lower in snippet.lower)
+                if topic_keywords:
+                    hits = self._hits(title) | self._hits(snippet)
+                    score += sum(1 for keyword in topic_keywords if keyword in hits)
+                if score > 0:
+                    ranked.append((result, score))
+            ranked.sort(key=lambda item: item[1], reverse=True)
+            ranked = ranked[:5]
         
-        # 按相关度排序
-        related_results.sort(key=lambda x: x['relevance_score'], reverse=True)
+        related_results = []
+        for result, score in ranked:
+            result_copy = result.copy()
+            result_copy['relevance_score'] = score
+            related_results.append(result_copy)
         
-        return related_results[:5]  # 返回最相关的5个结果
\ No newline at end of file
+        return related_results  # 返回最相关的5个结果
@@ -2,12 +2,19 @@
 知识管理器 - 整合搜索、分析和知识存储
 """
 import logging
+import sys
 import asyncio
 import threading
-import time
 import random
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+import heapq
+import time
+import bisect
+import itertools
+import re
+from typing import Dict, List, Optional, Any, Tuple, Union
+from datetime import datetime
+from collections import OrderedDict
+from dataclasses import dataclass
 
 from .web_searcher import WebSearcher
 from .content_analyzer import ContentAnalyzer
@@ -15,6 +22,72 @@ from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# 最多保留的发现数，超出后淘汰兴趣得分最低的
+MAX_DISCOVERIES = 150
+# 兴趣主题超过上限后按最近最少使用淘汰到保留数
+MAX_INTERESTS = 50
+KEEP_INTERESTS = 40
+
+# 类别和情感只有少数几种取值，驻留后所有发现共用同一个字符串对象
+_CATEGORIES = {c: sys.intern(c) for c in ('general', 'technology', 'science', 
+                                          'entertainment', 'news', 'learning')}
+_SENTIMENTS = {s: sys.intern(s) for s in ('positive', 'negative', 'neutral')}
+
+def _intern_label(value: Any, known: Dict[str, str]) -> Any:
+    """返回类别/情感标签的驻留字符串，非字符串（如情感计数）原样返回"""
+    if not isinstance(value, str):
+        return value
+    return known.get(value) or sys.intern(value)
+
+def _to_timestamp(value: Union[datetime, float, None]) -> float:
+    """把datetime或时间戳统一为时间戳，缺省为当前时间"""
+    if value is None:
+        return time.time()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+@dataclass(slots=True)
+class Discovery:
+    """一条发现的内容"""
+    topic: str
+    title: str
+    snippet: str
+    url: str
+    category: str
+    sentiment: str
+    discovered_at_ts: float  # 发现时间（Unix时间戳）
+    interest_score: float
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Discovery':
+        return cls(
+            topic=data.get('topic', ''),
+            title=data.get('title', ''),
+            snippet=data.get('snippet', ''),
+            url=data.get('url', ''),
+            category=_intern_label(data.get('category', 'general'), _CATEGORIES),
+            sentiment=_intern_label(data.get('sentiment', 'neutral'), _SENTIMENTS),
+            discovered_at_ts=_to_timestamp(data.get('discovered_at')),
+            interest_score=data.get('interest_score', 0.5)
+        )
+    
+    @property
+    def discovered_at(self) -> datetime:
+        return datetime.fromtimestamp(self.discovered_at_ts)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'topic': self.topic,
+            'title': self.title,
+            'snippet': self.snippet,
+            'url': self.url,
+            'category': self.category,
+            'sentiment': self.sentiment,
+            'discovered_at': self.discovered_at,
+            'interest_score': self.interest_score
+        }
+
 class KnowledgeManager:
     """知识管理器 - 智能生命体的知识获取和管理系统"""
     
@@ -28,16 +101,31 @@ class KnowledgeManager:
         
         # 知识库
         self.knowledge_base = {
-            'discoveries': [],        # 发现的有趣内容
+            'discoveries': [],        # 发现的有趣内容，(兴趣得分, 序号, 发现) 最小堆
             'learned_facts': [],      # 学到的事实
-            'interests': set(),       # 兴趣主题
+            'interests': OrderedDict(),  # 兴趣主题（LRU，最近使用的在末尾）
             'search_preferences': {}  # 搜索偏好
         }
         
+        self._discovery_seq = itertools.count()
+        # 按发现时间排序的 (发现时间戳, 序号, 堆条目)，与堆同步增删
+        self._discoveries_by_time = []
+        
+        # 兴趣主题匹配器 (正则, 前缀表, 权重)，兴趣变化后按需重建
+        self._interest_matcher = None
+        self._interests_dirty = True
+        # 兴趣主题的元组快照，供随机抽样使用，兴趣增删时置空
+        self._interests_cache = None
+        
         # 自动探索控制
         self.auto_exploration_active = False
-        self.exploration_thread = None
+        self.exploration_task = None
+        # (事件循环, 停止事件)，停止时唤醒正在等待间隔的探索循环
+        self._exploration_stop = None
         self.last_exploration_time = None
+        # 调用方没有运行中的事件循环时，探索协程在这个后台循环上运行
+        self._exploration_loop_host = None
+        self._exploration_loop_lock = threading.Lock()
         
         # 学习统计
         self.learning_stats = {
@@ -46,6 +134,8 @@ class KnowledgeManager:
             'topics_explored': set(),
             'favorite_categories': {}
         }
+        # favorite_categories 中的最大计数，打分时不必每次重新求max
+        self._fav_cat_max = 1
     
     def start_auto_exploration(self):
         """启动自动探索模式"""
@@ -58,79 +148,109 @@ class KnowledgeManager:
             return
         
         self.auto_exploration_active = True
-        self.exploration_thread = threading.Thread(target=self._exploration_loop, daemon=True)
-        self.exploration_thread.start()
+        stop_event = asyncio.Event()
+        
+        try:
+            # 调用方自己在事件循环里时直接挂到该循环上
+            loop = asyncio.get_running_loop()
+            self.exploration_task = loop.create_task(self._exploration_loop_async(stop_event))
+        except RuntimeError:
+            loop = self._get_exploration_loop()
+            self.exploration_task = asyncio.run_coroutine_threadsafe(
+                self._exploration_loop_async(stop_event), loop)
+        self._exploration_stop = (loop, stop_event)
         
         logger.info("自动探索模式已启动")
     
     def stop_auto_exploration(self):
         """停止自动探索模式"""
         self.auto_exploration_active = False
-        if self.exploration_thread:
-            self.exploration_thread.join(timeout=5)
+        if self._exploration_stop:
+            # 立即唤醒正在等待的间隔；正在进行的探索做完后循环退出，不会被中途打断
+            loop, stop_event = self._exploration_stop
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(stop_event.set)
+            self._exploration_stop = None
+        self.exploration_task = None
         
         logger.info("自动探索模式已停止")
     
-    def _exploration_loop(self):
-        """自动探索循环"""
-        while self.auto_exploration_active:
+    def _get_exploration_loop(self) -> asyncio.AbstractEventLoop:
+        """获取（必要时启动）后台事件循环"""
+        with self._exploration_loop_lock:
+            if self._exploration_loop_host is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, daemon=True,
+                                 name='knowledge_exploration').start()
+                self._exploration_loop_host = loop
+            return self._exploration_loop_host
+    
+    async def _exploration_loop_async(self, stop_event: asyncio.Event):
+        """自动探索循环，等待间隔期间收到停止信号立即退出"""
+        while not await self._wait_for_stop(stop_event, settings.knowledge.exploration_interval):
             try:
-                # 等待探索间隔
-                time.sleep(settings.knowledge.exploration_interval)
-                
-                if not self.auto_exploration_active:
-                    break
-                
                 # 执行探索
-                self._perform_exploration()
+                await self._perform_exploration_async()
                 
             except Exception as e:
                 logger.error(f"自动探索循环出错: {e}")
-                time.sleep(60)  # 出错后等待1分钟
+                # 出错后等待1分钟
+                if await self._wait_for_stop(stop_event, 60):
+                    break
     
-    def _perform_exploration(self):
-        """执行一次探索"""
+    @staticmethod
+    async def _wait_for_stop(stop_event: asyncio.Event, timeout: float) -> bool:
+        """最多等待timeout秒，收到停止信号时返回True"""
         try:
+            await asyncio.wait_for(stop_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    async def _perform_exploration_async(self):
+        """执行一次探索（协程版本，搜索期间不占用事件循环）"""
+        try:
+            # 本轮探索产生的记录共用一个时间戳
+            now = datetime.now()
+            
             # 选择探索主题
             topic = self._choose_exploration_topic()
             
             logger.info(f"开始探索主题: {topic}")
             
-            # 执行搜索
-            search_results = self.web_searcher.search(topic)
+            # 执行搜索，跳过之前探索中已经看过的结果
+            search_results = await self.web_searcher.search_async(topic, skip_seen=True)
             
-            if not search_results:
-                logger.info(f"未找到关于'{topic}'的搜索结果")
-                return
-            
-            # 分析结果
-            analysis_result = self.content_analyzer.analyze_search_results(search_results)
-            
-            if analysis_result['status'] != 'success':
-                logger.error(f"内容分析失败: {analysis_result.get('message', '未知错误')}")
-                return
-            
-            analysis = analysis_result['analysis']
-            
-            # 处理发现的内容
-            discoveries = self._process_discoveries(topic, search_results, analysis)
-            
-            # 更新知识库
-            self._update_knowledge_base(topic, discoveries, analysis)
-            
-            # 更新统计
-            self._update_learning_stats(topic, analysis)
-            
-            # 记录探索时间
-            self.last_exploration_time = datetime.now()
-            
-            # 通知AI大脑有新发现
-            if self.ai_brain and discoveries:
-                self._notify_ai_about_discoveries(topic, discoveries)
+            self._handle_exploration_results(topic, search_results, now)
             
         except Exception as e:
             logger.error(f"执行探索失败: {e}")
     
+    def _handle_exploration_results(self, topic: str, search_results: List[Dict[str, Any]], now: datetime):
+        """分析一轮探索的搜索结果并更新知识库"""
+        if not search_results:
+            logger.info(f"未找到关于'{topic}'的搜索结果")
+            return
+        
+        # 分析结果
+        analysis_result = self.content_analyzer.analyze_search_results(search_results)
+        
+        if analysis_result['status'] != 'success':
+            logger.error(f"内容分析失败: {analysis_result.get('message', '未知错误')}")
+            return
+        
+        analysis = analysis_result['analysis']
+        
+        # 处理发现、更新知识库和统计
+        discoveries = self._ingest_analysis(topic, search_results, analysis, now)
+        
+        # 记录探索时间
+        self.last_exploration_time = now
+        
+        # 通知AI大脑有新发现
+        if self.ai_brain and discoveries:
+            self._notify_ai_about_discoveries(topic, discoveries)
+    
     def _choose_exploration_topic(self) -> str:
         """选择探索主题"""
         # 获取当前情绪状态来影响主题选择
@@ -143,10 +263,9 @@ class KnowledgeManager:
         context = {'emotion': {'emotion': current_emotion}} if current_emotion else None
         suggested_topics = self.web_searcher.suggest_search_topics(context)
         
-        # 结合兴趣和随机性
+        # 结合兴趣和随机性，兴趣按最近使用排在末尾，取最近的三个
         if self.knowledge_base['interests']:
-            interests = list(self.knowledge_base['interests'])
-            suggested_topics.extend(interests[:3])
+            suggested_topics.extend(itertools.islice(reversed(self.knowledge_base['interests']), 3))
         
         # 添加一些随机性
         if random.random() < 0.3:  # 30%概率选择完全随机的主题
@@ -156,40 +275,62 @@ class KnowledgeManager:
         
         return topic
     
-    def _process_discoveries(self, topic: str, search_results: List[Dict[str, Any]], 
-                           analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """处理发现的内容"""
+    def _ingest_analysis(self, topic: str, search_results: List[Dict[str, Any]], 
+                         analysis: Dict[str, Any], now: Optional[datetime] = None) -> List[Discovery]:
+        """处理一次分析的结果：生成发现并加入知识库，再更新兴趣和统计"""
+        if now is None:
+            now = datetime.now()
+        now_ts = now.timestamp()
+        category = _intern_label(analysis.get('category', 'general'), _CATEGORIES)
+        sentiment = _intern_label(analysis.get('sentiment', 'neutral'), _SENTIMENTS)
+        interesting_results = analysis.get('interesting_results', [])
+        
+        # 处理有趣的结果：打分、生成发现并入堆在同一次遍历中完成
         discoveries = []
-        
-        # 处理有趣的结果
-        for result in analysis.get('interesting_results', []):
-            discovery = {
-                'topic': topic,
-                'title': result.get('title', ''),
-                'snippet': result.get('snippet', ''),
-                'url': result.get('url', ''),
-                'category': analysis.get('category', 'general'),
-                'sentiment': analysis.get('sentiment', 'neutral'),
-                'discovered_at': datetime.now(),
-                'interest_score': self._calculate_interest_score(result, analysis)
-            }
+        for result in interesting_results:
+            discovery = Discovery(
+                topic=topic,
+                title=result.get('title', ''),
+                snippet=result.get('snippet', ''),
+                url=result.get('url', ''),
+                category=category,
+                sentiment=sentiment,
+                discovered_at_ts=now_ts,
+                interest_score=self._calculate_interest_score(result, analysis)
+            )
+            self.add_discovery(discovery)
             discoveries.append(discovery)
         
         # 如果没有特别有趣的结果，选择最相关的
         if not discoveries and search_results:
             best_result = search_results[0]  # 假设第一个结果最相关
-            discovery = {
-                'topic': topic,
-                'title': best_result.get('title', ''),
-                'snippet': best_result.get('snippet', ''),
-                'url': best_result.get('url', ''),
-                'category': analysis.get('category', 'general'),
-                'sentiment': analysis.get('sentiment', 'neutral'),
-                'discovered_at': datetime.now(),
-                'interest_score': 0.5
-            }
+            discovery = Discovery(
+                topic=topic,
+                title=best_result.get('title', ''),
+                snippet=best_result.get('snippet', ''),
+                url=best_result.get('url', ''),
+                category=category,
+                sentiment=sentiment,
+                discovered_at_ts=now_ts,
+                interest_score=0.5
+            )
+            self.add_discovery(discovery)
             discoveries.append(discovery)
         
+        # 打分完成后再更新兴趣主题和类别偏好，不影响本轮得分
+        self._update_interests(topic, analysis)
+        
+        # 更新统计
+        self.learning_stats['total_searches'] += 1
+        self.learning_stats['discoveries_made'] += len(interesting_results)
+        self.learning_stats['topics_explored'].add(topic)
+        
+        # 更新类别偏好
+        count = self.learning_stats['favorite_categories'].get(category, 0) + 1
+        self.learning_stats['favorite_categories'][category] = count
+        # 类别计数只增不减，最大值随之更新即可
+        self._fav_cat_max = max(self._fav_cat_max, count)
+        
         return discoveries
     
     def _calculate_interest_score(self, result: Dict[str, Any], analysis: Dict[str, Any]) -> float:
@@ -198,9 +339,9 @@ class KnowledgeManager:
         
         # 基于类别调整
         category = analysis.get('category', 'general')
-        category_preferences = self.learning_stats['favorite_categories']
-        if category in category_preferences:
-            score += 0.2 * (category_preferences[category] / max(category_preferences.values()))
+        category_count = self.learning_stats['favorite_categories'].get(category, 0)
+        if category_count:
+            score += 0.2 * (category_count / self._fav_cat_max)
         
         # 基于情感倾向调整
         sentiment = analysis.get('sentiment', 'neutral')
@@ -209,59 +350,132 @@ class KnowledgeManager:
         elif sentiment == 'negative':
             score -= 0.1
         
-        # 基于关键词匹配调整
-        content = result.get('title', '') + ' ' + result.get('snippet', '')
-        for interest in self.knowledge_base['interests']:
-            if interest.lower() in content.lower():
-                score += 0.1
+        # 基于关键词匹配调整：每个出现在内容中的兴趣主题加0.1
+        if self.knowledge_base['interests']:
+            content = result.get('title', '') + ' ' + result.get('snippet', '')
+            score += 0.1 * self._count_interest_matches(content.lower())
         
         return min(1.0, max(0.0, score))
     
-    def _update_knowledge_base(self, topic: str, discoveries: List[Dict[str, Any]], 
-                             analysis: Dict[str, Any]):
-        """更新知识库"""
-        # 添加发现
-        self.knowledge_base['discoveries'].extend(discoveries)
+    def _build_interest_matcher(self):
+        """把全部兴趣主题编译成一个正则，一次扫描找出所有出现的兴趣"""
+        weights = {}
+        for interest in self.knowledge_base['interests']:
+            interest_lower = interest.lower()
+            if interest_lower:
+                weights[interest_lower] = weights.get(interest_lower, 0) + 1
+        
+        if not weights:
+            self._interest_matcher = None
+            return
+        
+        # 前瞻分组使重叠的兴趣也能命中；同一位置只匹配最长的，较短的前缀由前缀表补上
+        by_length = sorted(weights, key=len, reverse=True)
+        pattern = re.compile('(?=(' + '|'.join(re.escape(interest) for interest in by_length) + '))')
+        prefixes = {}
+        for interest in weights:
+            shorter = [other for other in weights if other != interest and interest.startswith(other)]
+            if shorter:
+                prefixes[interest] = shorter
+        
+        self._interest_matcher = (pattern, prefixes, weights)
+    
+    def _count_interest_matches(self, content_lower: str) -> int:
+        """统计出现在内容中的兴趣主题数"""
+        if self._interests_dirty:
+            self._build_interest_matcher()
+            self._interests_dirty = False
+        
+        if self._interest_matcher is None:
+            return 0
         
-        # 保持发现列表长度
-        if len(self.knowledge_base['discoveries']) > 200:
-            # 按兴趣得分排序，保留最有趣的
-            self.knowledge_base['discoveries'].sort(key=lambda x: x['interest_score'], reverse=True)
-            self.knowledge_base['discoveries'] = self.knowledge_base['discoveries'][:150]
+        pattern, prefixes, weights = self._interest_matcher
+        matched = set(pattern.findall(content_lower))
+        for interest in [interest for interest in matched if interest in prefixes]:
+            matched.update(prefixes[interest])
         
-        # 更新兴趣主题
-        self.knowledge_base['interests'].add(topic)
+        return sum(weights[interest] for interest in matched)
+    
+    def _update_interests(self, topic: str, analysis: Dict[str, Any]):
+        """更新兴趣主题"""
+        self._touch_interest(topic)
         
         # 添加关键主题到兴趣中
         for key_topic in analysis.get('key_topics', []):
             if len(key_topic) > 2:  # 忽略太短的词
-                self.knowledge_base['interests'].add(key_topic)
-        
-        # 保持兴趣列表大小
-        if len(self.knowledge_base['interests']) > 50:
-            # 这里可以实现更智能的裁剪策略
-            interests_list = list(self.knowledge_base['interests'])
-            self.knowledge_base['interests'] = set(interests_list[-40:])
+                self._touch_interest(key_topic)
+        
+        # 保持兴趣列表大小，淘汰最久未使用的
+        interests = self.knowledge_base['interests']
+        if len(interests) > MAX_INTERESTS:
+            while len(interests) > KEEP_INTERESTS:
+                interests.popitem(last=False)
+            self._mark_interests_changed()
     
-    def _update_learning_stats(self, topic: str, analysis: Dict[str, Any]):
-        """更新学习统计"""
-        self.learning_stats['total_searches'] += 1
-        self.learning_stats['discoveries_made'] += len(analysis.get('interesting_results', []))
-        self.learning_stats['topics_explored'].add(topic)
-        
-        # 更新类别偏好
-        category = analysis.get('category', 'general')
-        self.learning_stats['favorite_categories'][category] = \
-            self.learning_stats['favorite_categories'].get(category, 0) + 1
+    def _touch_interest(self, interest: str):
+        """添加或刷新一个兴趣主题"""
+        interests = self.knowledge_base['interests']
+        if interest in interests:
+            interests.move_to_end(interest)
+        else:
+            interests[interest] = None
+            self._mark_interests_changed()
+    
+    def _mark_interests_changed(self):
+        """兴趣主题增删后让匹配器和快照失效"""
+        self._interests_dirty = True
+        self._interests_cache = None
     
-    def _notify_ai_about_discoveries(self, topic: str, discoveries: List[Dict[str, Any]]):
+    def _interest_snapshot(self) -> Tuple[str, ...]:
+        """兴趣主题的元组快照"""
+        if self._interests_cache is None:
+            self._interests_cache = tuple(self.knowledge_base['interests'])
+        return self._interests_cache
+    
+    def add_discovery(self, discovery: Union[Discovery, Dict[str, Any]]):
+        """加入一个发现，超出容量时淘汰兴趣得分最低的"""
+        if isinstance(discovery, dict):
+            discovery = Discovery.from_dict(discovery)
+        heap = self.knowledge_base['discoveries']
+        entry = (discovery.interest_score, next(self._discovery_seq), discovery)
+        if len(heap) < MAX_DISCOVERIES:
+            heapq.heappush(heap, entry)
+            self._index_discovery(entry)
+        else:
+            evicted = heapq.heappushpop(heap, entry)
+            if evicted is not entry:
+                self._index_discovery(entry)
+                self._unindex_discovery(evicted)
+    
+    def trim_discoveries(self, keep: int):
+        """只保留兴趣得分最高的keep个发现"""
+        heap = self.knowledge_base['discoveries']
+        if len(heap) > keep:
+            heap[:] = heapq.nlargest(keep, heap)
+            heapq.heapify(heap)
+            self._discoveries_by_time = sorted(
+                (entry[2].discovered_at_ts, entry[1], entry) for entry in heap
+            )
+    
+    def _index_discovery(self, entry: Tuple[float, int, Discovery]):
+        """把堆条目加入时间索引"""
+        bisect.insort(self._discoveries_by_time, (entry[2].discovered_at_ts, entry[1], entry))
+    
+    def _unindex_discovery(self, entry: Tuple[float, int, Discovery]):
+        """从时间索引中移除堆条目"""
+        by_time = self._discoveries_by_time
+        index = bisect.bisect_left(by_time, (entry[2].discovered_at_ts, entry[1]))
+        if index < len(by_time) and by_time[index][1] == entry[1]:
+            del by_time[index]
+    
+    def _notify_ai_about_discoveries(self, topic: str, discoveries: List[Discovery]):
         """通知AI大脑有新发现"""
         if not discoveries:
             return
         
         try:
             # 选择最有趣的发现
-            best_discovery = max(discoveries, key=lambda x: x['interest_score'])
+            best_discovery = max(discoveries, key=lambda x: x.interest_score)
             
             # 触发好奇心和兴奋情绪
             if self.emotion_engine:
@@ -283,7 +497,7 @@ class KnowledgeManager:
             if hasattr(self.ai_brain, 'set_attention_focus'):
                 self.ai_brain.set_attention_focus(f"发现了关于{topic}的有趣内容")
             
-            logger.info(f"通知AI关于新发现: {best_discovery['title']}")
+            logger.info(f"通知AI关于新发现: {best_discovery.title}")
             
         except Exception as e:
             logger.error(f"通知AI发现失败: {e}")
@@ -315,21 +529,15 @@ class KnowledgeManager:
             
             analysis = analysis_result['analysis']
             
-            # 处理发现
-            discoveries = self._process_discoveries(query, search_results, analysis)
-            
-            # 更新知识库
-            self._update_knowledge_base(query, discoveries, analysis)
-            
-            # 更新统计
-            self._update_learning_stats(query, analysis)
+            # 处理发现、更新知识库和统计
+            discoveries = self._ingest_analysis(query, search_results, analysis)
             
             return {
                 'success': True,
                 'message': f"搜索完成，找到{len(search_results)}个结果",
                 'results': search_results,
                 'analysis': analysis,
-                'discoveries': discoveries
+                'discoveries': [discovery.to_dict() for discovery in discoveries]
             }
             
         except Exception as e:
@@ -342,17 +550,15 @@ class KnowledgeManager:
     
     def get_recent_discoveries(self, hours: int = 24) -> List[Dict[str, Any]]:
         """获取最近的发现"""
-        cutoff_time = datetime.now() - timedelta(hours=hours)
+        cutoff_ts = time.time() - hours * 3600
         
-        recent_discoveries = [
-            discovery for discovery in self.knowledge_base['discoveries']
-            if discovery['discovered_at'] > cutoff_time
-        ]
+        # 时间索引有序，二分找到截止时间之后的部分
+        by_time = self._discoveries_by_time
+        start = bisect.bisect_right(by_time, (cutoff_ts, float('inf')))
+        recent_entries = (by_time[i][2] for i in range(start, len(by_time)))
         
-        # 按兴趣得分排序
-        recent_discoveries.sort(key=lambda x: x['interest_score'], reverse=True)
-        
-        return recent_discoveries[:10]  # 最多返回10个
+        # 按兴趣得分取前10个
+        return [entry[2].to_dict() for entry in heapq.nlargest(10, recent_entries)]
     
     def get_knowledge_summary(self) -> Dict[str, Any]:
         """获取知识库摘要"""
@@ -370,7 +576,7 @@ class KnowledgeManager:
             },
             'last_exploration': self.last_exploration_time,
             'auto_exploration_active': self.auto_exploration_active,
-            'top_interests': list(self.knowledge_base['interests'])[:10]
+            'top_interests': list(self.knowledge_base['interests'].keys())[:10]
         }
     
     def share_discovery(self) -> Optional[Dict[str, Any]]:
@@ -385,7 +591,7 @@ class KnowledgeManager:
             discovery = random.choice(recent_discoveries[:5])  # 从前5个中随机选择
         else:
             # 如果没有最近的发现，从所有发现中选择
-            discovery = random.choice(self.knowledge_base['discoveries'])
+            discovery = random.choice(self.knowledge_base['discoveries'])[2].to_dict()
         
         return discovery
     
@@ -394,8 +600,8 @@ class KnowledgeManager:
         suggestions = []
         
         # 基于兴趣的建议
-        if self.knowledge_base['interests']:
-            interests = list(self.knowledge_base['interests'])
+        interests = self._interest_snapshot()
+        if interests:
             suggestions.extend(random.sample(interests, min(3, len(interests))))
         
         # 基于情绪的建议
@@ -2,33 +2,137 @@
 网络搜索模块 - 主动搜索网络信息
 """
 import logging
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import re
-from typing import Dict, List, Optional, Any
+import html
+import math
+import hashlib
+import functools
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 from urllib.parse import quote, urljoin
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
 import time
 
 try:
-    from bs4 import BeautifulSoup
+    # 更快的JSON解析
+    import orjson
+    _json_loads = orjson.loads
 except ImportError:
-    BeautifulSoup = None
+    _json_loads = json.loads
+
+try:
+    # 支持HTTP/2和连接复用的HTTP客户端
+    import httpx
+    HTTPX_AVAILABLE = True
+    try:
+        # httpx的HTTP/2支持依赖h2
+        import h2  # noqa: F401
+        HTTP2_AVAILABLE = True
+    except ImportError:
+        HTTP2_AVAILABLE = False
+except ImportError:
+    HTTPX_AVAILABLE = False
+    HTTP2_AVAILABLE = False
 
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# 搜索请求的请求头和连接池大小
+SEARCH_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+SEARCH_POOL_SIZE = 20
+# 搜索请求遇到临时故障时的重试次数和退避系数
+SEARCH_RETRIES = 2
+SEARCH_RETRY_BACKOFF = 0.3
+SEARCH_RETRY_STATUSES = (429, 502, 503, 504)
+# 按 Retry-After 等待的上限（秒）
+SEARCH_RETRY_AFTER_MAX = 10.0
+
+# 需要API密钥的搜索引擎，没有密钥时不参与搜索
+KEYED_ENGINES = ('serpapi', 'google')
+
+# 已返回过的URL的布隆过滤器参数
+URL_BLOOM_CAPACITY = 10000
+URL_BLOOM_ERROR_RATE = 1e-3
+
+class _BloomFilter:
+    """记录字符串是否出现过的布隆过滤器（可能误判为出现过，不会漏判）"""
+    
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, item: str) -> List[int]:
+        # 双重哈希：由一个128位摘要派生出全部位置
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+    
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+    
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+def _hour_bucket(hour: int) -> int:
+    """把小时划分为上午、下午和晚间三个时段"""
+    if 6 <= hour < 12:
+        return 0
+    if 12 <= hour < 18:
+        return 1
+    return 2
+
+@functools.lru_cache(maxsize=64)
+def _suggest_topics(emotion: str, hour_bucket: int) -> Tuple[str, ...]:
+    """由情绪和时段决定的搜索主题建议"""
+    suggestions = []
+    
+    # 基础感兴趣的主题
+    base_topics = ["今日新闻", "科技发展", "有趣发现", "创新发明"]
+    suggestions.extend(base_topics)
+    
+    # 基于情绪状态的建议
+    if emotion == 'curiosity':
+        suggestions.extend(["未解之谜", "科学探索", "新发现"])
+    elif emotion == 'joy':
+        suggestions.extend(["有趣视频", "搞笑内容", "快乐故事"])
+    elif emotion == 'excitement':
+        suggestions.extend(["最新科技", "突破性进展", "震撼发现"])
+    
+    # 基于时间的建议
+    if hour_bucket == 0:
+        suggestions.append("今日新闻")
+    elif hour_bucket == 1:
+        suggestions.append("下午资讯")
+    else:
+        suggestions.append("晚间新闻")
+    
+    return tuple(suggestions[:5])  # 返回最多5个建议
+
 class WebSearcher:
     """网络搜索器 - 支持多种搜索引擎"""
     
+    # 摘要里的HTML标签
+    _HTML_TAG_RE = re.compile(r'<[^>]*>')
+    
     def __init__(self):
-        self.search_history = []
         self.max_history = 100
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        self.search_history = deque(maxlen=self.max_history)
+        self.session = self._create_session()
         
         # 搜索引擎配置
         self.search_engines = {
@@ -36,6 +140,13 @@ class WebSearcher:
             'duckduckgo': self._search_duckduckgo,
             'google': self._search_google_custom
         }
+        # 本次会话返回过的URL，当前代写满后转为上一代
+        self._url_bloom = _BloomFilter(URL_BLOOM_CAPACITY, URL_BLOOM_ERROR_RATE)
+        self._url_bloom_previous = None
+        
+        # 多个搜索引擎同时发出请求，共用上面的session
+        self._executor = ThreadPoolExecutor(max_workers=len(self.search_engines),
+                                            thread_name_prefix='web_search')
         
         # 兴趣关键词（AI会主动搜索这些）
         self.interest_keywords = [
@@ -43,21 +154,65 @@ class WebSearcher:
             "新发明", "科学突破", "创意设计", "未来科技"
         ]
     
-    def search(self, query: str, max_results: int = None) -> List[Dict[str, Any]]:
-        """执行搜索"""
+    def _create_session(self):
+        """创建搜索用的HTTP会话，优先使用支持HTTP/2的httpx，临时故障自动重试"""
+        if HTTPX_AVAILABLE:
+            # httpx的传输层只重试连接失败，状态码和读取失败的重试由 _get 处理
+            transport = httpx.HTTPTransport(
+                http2=HTTP2_AVAILABLE, retries=SEARCH_RETRIES,
+                limits=httpx.Limits(max_keepalive_connections=SEARCH_POOL_SIZE)
+            )
+            return httpx.Client(transport=transport, headers=SEARCH_HEADERS, 
+                                timeout=10.0, follow_redirects=True)
+        
+        session = requests.Session()
+        session.headers.update(SEARCH_HEADERS)
+        retry = Retry(total=SEARCH_RETRIES, backoff_factor=SEARCH_RETRY_BACKOFF,
+                      status_forcelist=SEARCH_RETRY_STATUSES, allowed_methods=['GET'])
+        adapter = HTTPAdapter(pool_maxsize=SEARCH_POOL_SIZE, max_retries=retry)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    def _get(self, url: str, **kwargs):
+        """发送搜索GET请求，临时故障时退避重试"""
+        if not HTTPX_AVAILABLE:
+            # requests会话的适配器已配置重试
+            return self.session.get(url, **kwargs)
+        
+        for attempt in range(SEARCH_RETRIES + 1):
+            delay = SEARCH_RETRY_BACKOFF * (2 ** attempt)
+            try:
+                response = self.session.get(url, **kwargs)
+            except (httpx.ReadTimeout, httpx.ReadError, httpx.RemoteProtocolError):
+                if attempt == SEARCH_RETRIES:
+                    raise
+            else:
+                if response.status_code not in SEARCH_RETRY_STATUSES or attempt == SEARCH_RETRIES:
+                    return response
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = min(float(retry_after), SEARCH_RETRY_AFTER_MAX)
+                response.close()
+            time.sleep(delay)
+    
+    def search(self, query: str, max_results: int = None, skip_seen: bool = False) -> List[Dict[str, Any]]:
+        """执行搜索，skip_seen为True时跳过本次会话中已返回过的URL"""
         if max_results is None:
             max_results = settings.knowledge.max_search_results
             
         try:
-            # 选择搜索引擎
-            search_engine = settings.knowledge.search_engine
-            if search_engine not in self.search_engines:
-                search_engine = 'duckduckgo'  # 默认使用DuckDuckGo
+            engines, futures = self._submit_search(query, max_results, inline=True)
             
-            logger.info(f"使用{search_engine}搜索: {query}")
+            # 等待所有引擎返回
+            batches = []
+            for future in futures:
+                try:
+                    batches.append(future.result())
+                except Exception as e:
+                    batches.append(e)
             
-            # 执行搜索
-            results = self.search_engines[search_engine](query, max_results)
+            results = self._merge_results(engines, batches, max_results, skip_seen)
             
             # 记录搜索历史
             self._record_search(query, results)
@@ -68,6 +223,116 @@ class WebSearcher:
             logger.error(f"搜索失败: {e}")
             return self._get_fallback_results(query)
     
+    async def search_async(self, query: str, max_results: int = None,
+                           skip_seen: bool = False) -> List[Dict[str, Any]]:
+        """执行搜索（协程版本，不阻塞事件循环）"""
+        if max_results is None:
+            max_results = settings.knowledge.max_search_results
+            
+        try:
+            engines, futures = self._submit_search(query, max_results)
+            
+            batches = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures),
+                                           return_exceptions=True)
+            
+            results = self._merge_results(engines, batches, max_results, skip_seen)
+            
+            # 记录搜索历史
+            self._record_search(query, results)
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"搜索失败: {e}")
+            return self._get_fallback_results(query)
+    
+    def _select_engines(self) -> List[str]:
+        """选择本次搜索使用的引擎：配置的引擎优先，DuckDuckGo兜底"""
+        search_engine = settings.knowledge.search_engine
+        if search_engine not in self.search_engines:
+            search_engine = 'duckduckgo'  # 默认使用DuckDuckGo
+        
+        engines = []
+        if search_engine not in KEYED_ENGINES or settings.knowledge.search_api_key:
+            engines.append(search_engine)
+        if 'duckduckgo' not in engines:
+            engines.append('duckduckgo')
+        return engines
+    
+    def _submit_search(self, query: str, max_results: int, inline: bool = False):
+        """同时向各搜索引擎发出请求，返回 (引擎列表, future列表)；inline只给同步搜索使用"""
+        engines = self._select_engines()
+        logger.info(f"使用{'+'.join(engines)}搜索: {query}")
+        
+        futures = []
+        for engine in engines:
+            if inline and len(engines) == 1:
+                # 同步搜索只有一个引擎时直接在当前线程执行
+                future = Future()
+                try:
+                    future.set_result(self.search_engines[engine](query, max_results))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                future = self._executor.submit(self.search_engines[engine], query, max_results)
+            futures.append(future)
+        
+        return engines, futures
+    
+    def _merge_results(self, engines: List[str], batches: List[Any], max_results: int,
+                       skip_seen: bool = False) -> List[Dict[str, Any]]:
+        """按引擎优先顺序合并结果，按URL去重"""
+        candidates = []
+        seen_urls = set()
+        for engine, batch in zip(engines, batches):
+            if isinstance(batch, BaseException):
+                logger.error(f"{engine}搜索失败: {batch}")
+                continue
+            for result in batch:
+                url = result.get('url')
+                if url:
+                    if url in seen_urls:
+                        continue
+                    seen_urls.add(url)
+                candidates.append(result)
+        
+        if skip_seen:
+            candidates = self._dedupe_results(candidates)
+        
+        results = []
+        for result in candidates:
+            if len(results) >= max_results:
+                break
+            results.append(result)
+        
+        # 记住返回过的URL
+        for result in results:
+            if result.get('url'):
+                self._remember_url(result['url'])
+        
+        return results
+    
+    def _dedupe_results(self, results: List[Dict[str, Any]]):
+        """跳过本次会话中已返回过的结果"""
+        for result in results:
+            url = result.get('url')
+            if url and self._url_seen(url):
+                continue
+            yield result
+    
+    def _url_seen(self, url: str) -> bool:
+        """URL是否已返回过"""
+        if url in self._url_bloom:
+            return True
+        return self._url_bloom_previous is not None and url in self._url_bloom_previous
+    
+    def _remember_url(self, url: str):
+        """记录返回过的URL，当前代写满后滚动"""
+        if self._url_bloom.count >= URL_BLOOM_CAPACITY:
+            self._url_bloom_previous = self._url_bloom
+            self._url_bloom = _BloomFilter(URL_BLOOM_CAPACITY, URL_BLOOM_ERROR_RATE)
+        self._url_bloom.add(url)
+    
     def _search_serpapi(self, query: str, max_results: int) -> List[Dict[str, Any]]:
         """使用SerpAPI搜索"""
         try:
@@ -83,20 +348,22 @@ class WebSearcher:
                 'hl': 'zh'
             }
             
-            response = self.session.get(url, params=params, timeout=10)
+            response = self._get(url, params=params, timeout=10)
             response.raise_for_status()
             
-            data = response.json()
+            data = _json_loads(response.content)
             results = []
+            # 本次返回的结果共用一个时间戳
+            now = datetime.now()
             
             # 解析有机搜索结果
             if 'organic_results' in data:
                 for item in data['organic_results'][:max_results]:
                     results.append({
-                        'title': item.get('title', ''),
+                        'title': self._clean_html(item.get('title', '')),
                         'url': item.get('link', ''),
-                        'snippet': item.get('snippet', ''),
-                        'timestamp': datetime.now(),
+                        'snippet': self._clean_html(item.get('snippet', '')),
+                        'timestamp': now,
                         'source': 'serpapi'
                     })
             
@@ -118,19 +385,21 @@ class WebSearcher:
                 'skip_disambig': '1'
             }
             
-            response = self.session.get(api_url, params=params, timeout=10)
+            response = self._get(api_url, params=params, timeout=10)
             response.raise_for_status()
             
-            data = response.json()
+            data = _json_loads(response.content)
             results = []
+            # 本次返回的结果共用一个时间戳
+            now = datetime.now()
             
             # 添加即时答案
             if data.get('Abstract'):
                 results.append({
-                    'title': data.get('Heading', query),
+                    'title': self._clean_html(data.get('Heading', query)),
                     'url': data.get('AbstractURL', ''),
-                    'snippet': data.get('Abstract', ''),
-                    'timestamp': datetime.now(),
+                    'snippet': self._clean_html(data.get('Abstract', '')),
+                    'timestamp': now,
                     'source': 'duckduckgo_instant'
                 })
             
@@ -138,10 +407,10 @@ class WebSearcher:
             for topic in data.get('RelatedTopics', [])[:max_results-1]:
                 if isinstance(topic, dict) and 'Text' in topic:
                     results.append({
-                        'title': topic.get('Text', '').split(' - ')[0],
+                        'title': self._clean_html(topic.get('Text', '').split(' - ')[0]),
                         'url': topic.get('FirstURL', ''),
-                        'snippet': topic.get('Text', ''),
-                        'timestamp': datetime.now(),
+                        'snippet': self._clean_html(topic.get('Text', '')),
+                        'timestamp': now,
                         'source': 'duckduckgo_related'
                     })
             
@@ -170,19 +439,21 @@ class WebSearcher:
                 'hl': 'zh'
             }
             
-            response = self.session.get(url, params=params, timeout=10)
+            response = self._get(url, params=params, timeout=10)
             response.raise_for_status()
             
-            data = response.json()
+            data = _json_loads(response.content)
             results = []
+            # 本次返回的结果共用一个时间戳
+            now = datetime.now()
             
             if 'items' in data:
                 for item in data['items']:
                     results.append({
-                        'title': item.get('title', ''),
+                        'title': self._clean_html(item.get('title', '')),
                         'url': item.get('link', ''),
-                        'snippet': item.get('snippet', ''),
-                        'timestamp': datetime.now(),
+                        'snippet': self._clean_html(item.get('snippet', '')),
+                        'timestamp': now,
                         'source': 'google_custom'
                     })
             
@@ -194,13 +465,15 @@ class WebSearcher:
     
     def _clean_html(self, text: str) -> str:
         """清理HTML标签"""
-        if BeautifulSoup:
-            soup = BeautifulSoup(text, 'html.parser')
-            return soup.get_text()
-        else:
-            # 简单的HTML标签清理
-            clean = re.compile('<.*?>')
-            return re.sub(clean, '', text)
+        # 大多数摘要是纯文本，直接返回
+        if '<' not in text and '&' not in text:
+            return text
+        
+        if '<' in text:
+            text = self._HTML_TAG_RE.sub('', text)
+        if '&' in text:
+            text = html.unescape(text)
+        return text
     
     def _get_fallback_results(self, query: str) -> List[Dict[str, Any]]:
         """获取备用搜索结果"""
@@ -223,12 +496,9 @@ class WebSearcher:
             'success': len(results) > 0
         }
         
+        # deque 满后自动丢弃最旧的记录
         self.search_history.append(search_record)
         
-        # 保持历史长度
-        if len(self.search_history) > self.max_history:
-            self.search_history = self.search_history[-self.max_history:]
-        
         logger.info(f"搜索记录: {query} -> {len(results)} 个结果")
     
     def get_random_interest_query(self) -> str:
@@ -238,32 +508,12 @@ class WebSearcher:
     
     def suggest_search_topics(self, context: Dict[str, Any] = None) -> List[str]:
         """基于上下文建议搜索主题"""
-        suggestions = []
-        
-        # 基础感兴趣的主题
-        base_topics = ["今日新闻", "科技发展", "有趣发现", "创新发明"]
-        suggestions.extend(base_topics)
-        
-        # 基于情绪状态的建议
+        emotion = ''
         if context and context.get('emotion'):
             emotion = context['emotion'].get('emotion', '')
-            if emotion == 'curiosity':
-                suggestions.extend(["未解之谜", "科学探索", "新发现"])
-            elif emotion == 'joy':
-                suggestions.extend(["有趣视频", "搞笑内容", "快乐故事"])
-            elif emotion == 'excitement':
-                suggestions.extend(["最新科技", "突破性进展", "震撼发现"])
-        
-        # 基于时间的建议
-        current_hour = datetime.now().hour
-        if 6 <= current_hour < 12:
-            suggestions.append("今日新闻")
-        elif 12 <= current_hour < 18:
-            suggestions.append("下午资讯")
-        else:
-            suggestions.append("晚间新闻")
         
-        return suggestions[:5]  # 返回最多5个建议
+        # 调用方会修改返回的列表，缓存的是元组
+        return list(_suggest_topics(emotion, _hour_bucket(datetime.now().hour)))
     
     def get_search_statistics(self) -> Dict[str, Any]:
         """获取搜索统计信息"""
@@ -275,7 +525,8 @@ class WebSearcher:
         success_rate = successful_searches / total_searches
         
         # 最近搜索的主题
-        recent_queries = [search['query'] for search in self.search_history[-5:]]
+        # deque 两端的下标访问是O(1)
+        recent_queries = [self.search_history[i]['query'] for i in range(-min(5, total_searches), 0)]
         
         return {
             'total_searches': total_searches,
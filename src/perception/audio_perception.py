@@ -2,12 +2,16 @@
 音频感知模块 - 处理麦克风输入和语音识别
 """
 import logging
+import math
+import hashlib
 import threading
 import time
 import numpy as np
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Tuple
 from datetime import datetime
 import queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import pyaudio
@@ -19,10 +23,49 @@ try:
 except ImportError:
     sr = None
 
+try:
+    # 能量计算的JIT编译（可选）
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# 语音识别结果缓存的条目数
+ASR_CACHE_SIZE = 128
+# 每次监听的最长短语时间（秒）
+PHRASE_TIME_LIMIT = 5
+# 待处理音频最多缓冲的时长（秒），超出后丢弃最旧的
+AUDIO_QUEUE_MAX_SECONDS = 30
+# 排队中的短语合并后一次识别的最长时长（秒）
+MAX_MERGED_SECONDS = 15
+
+if NUMBA_AVAILABLE:
+    # listen() 返回的短语长度随停顿变化，不按长度生成特化版本
+    @njit(cache=True, fastmath=True, boundscheck=False)
+    def _sum_squares_int16(samples):
+        """int16采样的平方和（一次遍历，在int64中累加）"""
+        total = 0
+        for i in range(samples.shape[0]):
+            value = np.int64(samples[i])
+            total += value * value
+        return total
+else:
+    def _sum_squares_int16(samples):
+        """int16采样的平方和（在int64中累加，int16直接平方会溢出）"""
+        wide = samples.astype(np.int64)
+        return int(np.dot(wide, wide))
+
+def _sum_squares(frame_data: bytes) -> Tuple[int, int]:
+    """16位PCM音频的平方和与采样数（均方根能量为 sqrt(平方和 / 采样数)）"""
+    audio_array = np.frombuffer(frame_data, dtype=np.int16)
+    if audio_array.size == 0:
+        return 0, 0
+    return _sum_squares_int16(audio_array), audio_array.size
+
 class AudioPerception:
     """
     音频感知系统 - 负责声音捕获、语音识别和音频分析
@@ -36,19 +79,45 @@ class AudioPerception:
         
         # 音频数据
         self.current_audio_data = None
-        self.audio_history = []
         self.max_history_length = 50
+        # 每段音频的时间（time.monotonic）和均方能量（列式环形缓冲区），只保留计算活动水平需要的数值，不保留原始音频
+        self._hist_head = 0
+        self._hist_len = 0
+        self._hist_time = np.zeros(self.max_history_length, dtype=np.float64)
+        self._hist_power = np.zeros(self.max_history_length, dtype=np.float64)
         
         # 分析结果
         self.sound_detected = False
         self.voice_detected = False
         self.last_speech_text = ""
         self.ambient_noise_level = 0.0
+        # 检测阈值及其平方的缓存（_sound_thr, _sig_thr 等），音频处理时不必每次从配置和噪音水平重新计算
+        self._refresh_thresholds()
+        
+        # 上一次检测变化时的状态，None表示还没有检测过
+        self._prev_sound_detected = None
+        self._prev_voice_detected = None
+        self._prev_speech_text = None
         
         # 线程控制
         self.listening_thread = None
+        self.processing_thread = None
+        self.dispatch_thread = None
         self.should_stop = False
-        self.audio_queue = queue.Queue()
+        # 采集线程只负责录音，采集到的音频经有界队列交给处理线程
+        self.audio_queue = queue.Queue(maxsize=AUDIO_QUEUE_MAX_SECONDS // PHRASE_TIME_LIMIT)
+        # 语音识别和回调在常驻线程池中执行，不为每段音频新建线程
+        self._recognition_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asr')
+        self._callback_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='audio_callback')
+        self._queued_recognition = None
+        self._queued_audio = None
+        # 音频指纹 -> 识别文本（LRU，只在识别线程中访问），重复的短语不必再次请求识别服务
+        self._asr_cache = OrderedDict()
+        # 监听期间识别出的下一句话，供单次识别等待
+        self._next_speech_event = threading.Event()
+        self._next_speech_text = None
+        # 识别线程把结果放入队列，由分发线程统一更新状态和调用回调
+        self._result_queue = queue.Queue()
         
         # 回调函数
         self.speech_callback: Optional[Callable] = None
@@ -80,6 +149,11 @@ class AudioPerception:
                     logger.info("调整环境噪音...")
                     self.recognizer.adjust_for_ambient_noise(source, duration=1)
                     self.ambient_noise_level = self.recognizer.energy_threshold
+                    self._refresh_thresholds()
+                
+                if NUMBA_AVAILABLE:
+                    # 预先编译能量计算，避免第一段音频等待编译
+                    _sum_squares(bytes(32))
                 
                 logger.info(f"音频工具初始化成功，噪音阈值: {self.ambient_noise_level}")
             else:
@@ -111,9 +185,13 @@ class AudioPerception:
             self.is_active = True
             self.should_stop = False
             
-            # 启动监听线程
+            # 启动监听线程、处理线程和识别结果分发线程
             self.listening_thread = threading.Thread(target=self._listening_loop, daemon=True)
             self.listening_thread.start()
+            self.processing_thread = threading.Thread(target=self._processing_loop, daemon=True)
+            self.processing_thread.start()
+            self.dispatch_thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+            self.dispatch_thread.start()
             
             logger.info("开始音频监听")
             return True
@@ -129,97 +207,162 @@ class AudioPerception:
         
         if self.listening_thread and self.listening_thread.is_alive():
             self.listening_thread.join(timeout=5)
+        if self.processing_thread and self.processing_thread.is_alive():
+            self.processing_thread.join(timeout=5)
+        if self.dispatch_thread and self.dispatch_thread.is_alive():
+            self.dispatch_thread.join(timeout=5)
         
         logger.info("音频监听已停止")
     
     def _listening_loop(self):
-        """音频监听循环"""
+        """音频监听循环，麦克风流在整个监听期间保持打开"""
         while not self.should_stop and self.is_active:
             try:
-                # 监听音频
+                # 只打开一次音频流，不再每次监听都重新打开和配置
                 with self.microphone as source:
-                    # 短时间监听，避免阻塞太久
-                    try:
-                        audio_data = self.recognizer.listen(source, timeout=1, phrase_time_limit=5)
-                        self._process_audio(audio_data)
-                    except sr.WaitTimeoutError:
-                        # 超时是正常的，继续下一次循环
-                        continue
+                    while not self.should_stop and self.is_active:
+                        # 短时间监听，避免阻塞太久
+                        try:
+                            audio_data = self.recognizer.listen(source, timeout=1, 
+                                                                phrase_time_limit=PHRASE_TIME_LIMIT)
+                        except sr.WaitTimeoutError:
+                            # 超时是正常的，继续下一次循环
+                            continue
+                        
+                        # 交给处理线程，立即开始下一次监听
+                        self._enqueue_audio(audio_data)
                     
             except Exception as e:
                 logger.error(f"音频监听出错: {e}")
                 time.sleep(1)
     
+    def _enqueue_audio(self, audio_data):
+        """把音频放入处理队列，队列满时先丢弃最旧的一段"""
+        while True:
+            try:
+                self.audio_queue.put_nowait(audio_data)
+                return
+            except queue.Full:
+                try:
+                    self.audio_queue.get_nowait()
+                except queue.Empty:
+                    pass
+    
+    def _processing_loop(self):
+        """音频处理循环"""
+        while not self.should_stop:
+            try:
+                audio_data = self.audio_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._process_audio(audio_data)
+    
     def _process_audio(self, audio_data):
         """处理音频数据"""
         try:
             # 更新音频数据
             self.current_audio_data = audio_data
-            self._add_to_history(audio_data)
             
-            # 检测声音
-            self._detect_sound(audio_data)
+            # 平方和只计算一次，历史记录和声音检测共用
+            if hasattr(audio_data, 'frame_data'):
+                sum_sq, n = _sum_squares(audio_data.frame_data)
+                self._add_to_history(sum_sq / n if n else 0.0)
+                
+                # 检测声音
+                self._detect_sound(sum_sq, n)
+            else:
+                self._add_to_history(0.0)
             
             # 异步进行语音识别（避免阻塞主循环）
-            threading.Thread(target=self._recognize_speech, args=(audio_data,), daemon=True).start()
+            self._submit_recognition(audio_data)
             
         except Exception as e:
             logger.error(f"处理音频数据失败: {e}")
     
-    def _add_to_history(self, audio_data):
-        """添加音频数据到历史记录"""
-        timestamp = datetime.now()
-        self.audio_history.append({
-            'audio_data': audio_data,
-            'timestamp': timestamp
-        })
-        
-        # 保持历史长度
-        if len(self.audio_history) > self.max_history_length:
-            self.audio_history.pop(0)
+    def _submit_recognition(self, audio_data):
+        """提交语音识别，上一段还在排队时与它合并成一次请求"""
+        if self._queued_recognition is not None and not self._queued_recognition.done():
+            merged = self._merge_audio(self._queued_audio, audio_data)
+            # 能合并且上一段还没开始识别时才取消它，合并后只需一次网络请求
+            if merged is not None and self._queued_recognition.cancel():
+                audio_data = merged
+        self._queued_audio = audio_data
+        self._queued_recognition = self._recognition_pool.submit(self._recognize_speech, audio_data)
+    
+    def _merge_audio(self, previous, current):
+        """拼接两段连续的音频，格式不同或超过最长时长时返回None"""
+        if (previous.sample_rate != current.sample_rate 
+                or previous.sample_width != current.sample_width):
+            return None
+        if (len(previous.frame_data) + len(current.frame_data) 
+                > MAX_MERGED_SECONDS * current.sample_rate * current.sample_width):
+            return None
+        return sr.AudioData(previous.frame_data + current.frame_data, 
+                            current.sample_rate, current.sample_width)
     
-    def _detect_sound(self, audio_data):
+    def _add_to_history(self, power: float):
+        """添加一段音频的均方能量到历史记录（写满后覆盖最旧的）"""
+        slot = self._hist_head % self.max_history_length
+        self._hist_time[slot] = time.monotonic()
+        self._hist_power[slot] = power
+        self._hist_head += 1
+        self._hist_len = min(self._hist_len + 1, self.max_history_length)
+    
+    def _detect_sound(self, sum_sq: int, n: int):
         """检测声音存在"""
         try:
-            # 简单的音量检测
-            if hasattr(audio_data, 'frame_data'):
-                # 计算音频能量
-                audio_array = np.frombuffer(audio_data.frame_data, dtype=np.int16)
-                energy = np.sqrt(np.mean(audio_array**2))
+            # 简单的音量检测：能量 > 阈值 等价于 平方和 > 阈值² * 采样数，不必开方
+            if sum_sq > self._sound_thr_sq * n:
+                self.sound_detected = True
                 
-                # 如果能量超过阈值，认为检测到声音
-                if energy > settings.perception.audio_threshold * 1000:
-                    self.sound_detected = True
-                    logger.debug(f"检测到声音，能量: {energy:.2f}")
+                # 只有用到能量值时才开方
+                debug_enabled = logger.isEnabledFor(logging.DEBUG)
+                if self.sound_callback or debug_enabled:
+                    energy = math.sqrt(sum_sq / n)
+                    if debug_enabled:
+                        logger.debug(f"检测到声音，能量: {energy:.2f}")
                     
                     # 调用声音回调
                     if self.sound_callback:
-                        threading.Thread(target=self.sound_callback, args=(energy,), daemon=True).start()
-                else:
-                    self.sound_detected = False
+                        self._callback_pool.submit(self._run_callback, self.sound_callback, energy)
+            else:
+                self.sound_detected = False
             
         except Exception as e:
             logger.error(f"声音检测失败: {e}")
     
+    def _run_callback(self, callback: Callable, *args):
+        """在线程池中执行回调，记录回调抛出的异常"""
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"音频回调执行失败: {e}")
+    
     def _recognize_speech(self, audio_data):
         """识别语音内容"""
         try:
-            # 使用Google语音识别
-            text = self.recognizer.recognize_google(audio_data, language='zh-CN')
+            # 完全相同的音频直接使用缓存的识别结果
+            fingerprint = (audio_data.sample_rate,
+                           hashlib.blake2b(audio_data.frame_data, digest_size=16).digest())
+            text = self._asr_cache.get(fingerprint)
+            if text is not None:
+                self._asr_cache.move_to_end(fingerprint)
+            else:
+                # 使用Google语音识别
+                text = self.recognizer.recognize_google(audio_data, language='zh-CN')
+                if text:
+                    self._asr_cache[fingerprint] = text
+                    if len(self._asr_cache) > ASR_CACHE_SIZE:
+                        self._asr_cache.popitem(last=False)
             
             if text:
-                self.voice_detected = True
-                self.last_speech_text = text
                 logger.info(f"识别到语音: {text}")
-                
-                # 调用语音回调
-                if self.speech_callback:
-                    self.speech_callback(text)
+                self._result_queue.put(text)
             
         except sr.UnknownValueError:
             # 无法识别语音内容，但可能有声音
             logger.debug("检测到声音但无法识别内容")
-            self.voice_detected = False
+            self._result_queue.put(None)
             
         except sr.RequestError as e:
             logger.error(f"语音识别请求失败: {e}")
@@ -227,35 +370,46 @@ class AudioPerception:
         except Exception as e:
             logger.error(f"语音识别失败: {e}")
     
+    def _dispatch_loop(self):
+        """识别结果分发循环：语音状态只在这个线程中更新，回调也在这里按顺序执行"""
+        while not self.should_stop:
+            try:
+                text = self._result_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._apply_recognition(text)
+    
+    def _apply_recognition(self, text: Optional[str]):
+        """根据一次识别结果更新语音状态，None表示有声音但无法识别"""
+        if text is None:
+            self.voice_detected = False
+            return
+        
+        self.voice_detected = True
+        self.last_speech_text = text
+        
+        self._next_speech_text = text
+        self._next_speech_event.set()
+        
+        # 调用语音回调
+        if self.speech_callback:
+            self._run_callback(self.speech_callback, text)
+    
     def recognize_speech_once(self) -> Optional[str]:
-        """单次语音识别"""
+        """单次语音识别：等待监听中识别出的下一句话"""
         if not self.is_active or self.recognizer is None or self.microphone is None:
             return None
         
-        try:
-            logger.info("请说话...")
-            with self.microphone as source:
-                audio_data = self.recognizer.listen(source, timeout=5, phrase_time_limit=10)
-                
-            text = self.recognizer.recognize_google(audio_data, language='zh-CN')
+        # 监听期间麦克风流由监听线程持有，这里等待它识别出的下一句话
+        logger.info("请说话...")
+        self._next_speech_event.clear()
+        if self._next_speech_event.wait(timeout=15):
+            text = self._next_speech_text
             logger.info(f"识别到: {text}")
             return text
-            
-        except sr.WaitTimeoutError:
-            logger.info("等待超时，未检测到语音")
-            return None
-            
-        except sr.UnknownValueError:
-            logger.info("无法识别语音内容")
-            return None
-            
-        except sr.RequestError as e:
-            logger.error(f"语音识别请求失败: {e}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"语音识别失败: {e}")
-            return None
+        
+        logger.info("等待超时，未识别到语音")
+        return None
     
     def analyze_audio_environment(self) -> Dict[str, Any]:
         """分析音频环境"""
@@ -303,23 +457,19 @@ class AudioPerception:
     
     def _calculate_audio_activity(self) -> float:
         """计算音频活动水平"""
-        if not self.audio_history:
+        n = self._hist_len
+        if n == 0:
             return 0.0
         
         try:
             # 计算最近一段时间的音频活动
-            recent_count = 0
-            total_count = 0
-            cutoff_time = datetime.now().timestamp() - 60  # 最近1分钟
-            
-            for record in self.audio_history:
-                if record['timestamp'].timestamp() > cutoff_time:
-                    total_count += 1
-                    if self._has_significant_audio(record['audio_data']):
-                        recent_count += 1
+            cutoff_time = time.monotonic() - 60  # 最近1分钟
+            recent = self._hist_time[:n] > cutoff_time
+            total_count = np.count_nonzero(recent)
             
             if total_count > 0:
-                return recent_count / total_count
+                significant = self._hist_power[:n][recent] > self._sig_thr_sq
+                return np.count_nonzero(significant) / total_count
             else:
                 return 0.0
                 
@@ -327,43 +477,30 @@ class AudioPerception:
             logger.error(f"计算音频活动失败: {e}")
             return 0.0
     
-    def _has_significant_audio(self, audio_data) -> bool:
-        """判断音频数据是否包含显著声音"""
-        try:
-            if hasattr(audio_data, 'frame_data'):
-                audio_array = np.frombuffer(audio_data.frame_data, dtype=np.int16)
-                energy = np.sqrt(np.mean(audio_array**2))
-                return energy > self.ambient_noise_level * 1.5
-            return False
-        except Exception:
-            return False
-    
     def detect_audio_changes(self) -> List[str]:
         """检测音频环境变化"""
         changes = []
         
         # 检测声音状态变化
-        if hasattr(self, '_prev_sound_detected'):
-            if self.sound_detected != self._prev_sound_detected:
-                if self.sound_detected:
-                    changes.append("开始检测到声音")
-                else:
-                    changes.append("环境变安静了")
+        if self._prev_sound_detected is not None and self.sound_detected != self._prev_sound_detected:
+            if self.sound_detected:
+                changes.append("开始检测到声音")
+            else:
+                changes.append("环境变安静了")
         self._prev_sound_detected = self.sound_detected
         
         # 检测语音状态变化
-        if hasattr(self, '_prev_voice_detected'):
-            if self.voice_detected != self._prev_voice_detected:
-                if self.voice_detected:
-                    changes.append("检测到有人说话")
-                else:
-                    changes.append("说话声停止了")
+        if self._prev_voice_detected is not None and self.voice_detected != self._prev_voice_detected:
+            if self.voice_detected:
+                changes.append("检测到有人说话")
+            else:
+                changes.append("说话声停止了")
         self._prev_voice_detected = self.voice_detected
         
         # 检测新的语音内容
-        if hasattr(self, '_prev_speech_text'):
-            if self.last_speech_text != self._prev_speech_text and self.last_speech_text:
-                changes.append(f"听到新的话：{self.last_speech_text}")
+        if (self._prev_speech_text is not None and self.last_speech_text 
+                and self.last_speech_text != self._prev_speech_text):
+            changes.append(f"听到新的话：{self.last_speech_text}")
         self._prev_speech_text = self.last_speech_text
         
         return changes
@@ -376,11 +513,22 @@ class AudioPerception:
             "voice_detected": self.voice_detected,
             "last_speech": self.last_speech_text,
             "ambient_noise_level": self.ambient_noise_level,
-            "audio_history_count": len(self.audio_history)
+            "audio_history_count": self._hist_len
         }
     
+    def _refresh_thresholds(self):
+        """根据配置和环境噪音重新计算检测阈值"""
+        # 能量超过配置阈值算检测到声音
+        self._sound_thr = settings.perception.audio_threshold * 1000.0
+        # 能量超过环境噪音1.5倍的算作显著声音
+        self._sig_thr = self.ambient_noise_level * 1.5
+        # 与平方和/均方能量直接比较的平方阈值
+        self._sound_thr_sq = self._sound_thr ** 2
+        self._sig_thr_sq = self._sig_thr ** 2
+    
     def adjust_sensitivity(self, sensitivity: float):
         """调整听力敏感度"""
+        self._refresh_thresholds()
         if self.recognizer:
             # 调整能量阈值
             self.recognizer.energy_threshold = self.ambient_noise_level * sensitivity
@@ -388,4 +536,6 @@ class AudioPerception:
     
     def __del__(self):
         """析构函数"""
-        self.stop_listening()
\ No newline at end of file
+        self.stop_listening()
+        self._recognition_pool.shutdown(wait=False, cancel_futures=True)
+        self._callback_pool.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
@@ -2,11 +2,22 @@
 增强视觉感知模块 - 物体识别和场景理解
 """
 import logging
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import base64
-import io
-from typing import Dict, List, Optional, Any
+import copy
+import json
+import re
+import hashlib
+import itertools
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 try:
@@ -15,14 +26,89 @@ except ImportError:
     cv2 = None
 
 try:
-    from PIL import Image
+    # 更快的JSON编码器，直接输出bytes
+    import orjson
+    ORJSON_AVAILABLE = True
 except ImportError:
-    Image = None
+    ORJSON_AVAILABLE = False
+
+try:
+    # SIMD加速的base64编码
+    import pybase64
+except ImportError:
+    pybase64 = None
 
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# 视觉API请求遇到临时故障时的重试次数、退避系数和需要重试的状态码
+VISION_RETRIES = 3
+VISION_RETRY_BACKOFF = 0.3
+VISION_RETRY_STATUSES = (429, 503)
+# 同时进行的图像分析数上限
+VISION_MAX_WORKERS = 8
+# Google Vision 单次请求最多包含的图像数
+GOOGLE_BATCH_SIZE = 16
+# 分析结果缓存的条目数上限
+RESULT_CACHE_SIZE = 256
+# 本地降级分析的服务名，这类结果不进缓存，下次仍会请求远端API
+LOCAL_SERVICES = ('local_fallback', 'opencv_local')
+# 物体分类关键词，按匹配优先级排列
+CATEGORY_KEYWORDS = (
+    ('person', ('person', 'man', 'woman', 'child', 'people')),
+    ('animal', ('dog', 'cat', 'bird', 'animal')),
+    ('vehicle', ('car', 'bus', 'truck', 'bicycle')),
+    ('furniture', ('chair', 'table', 'sofa', 'bed')),
+    ('food', ('food', 'drink', 'fruit', 'meal')),
+    ('nature', ('tree', 'flower', 'grass', 'sky')),
+    ('building', ('building', 'house', 'office')),
+    ('electronics', ('phone', 'computer', 'screen')),
+)
+
+# Google Vision 完整分析请求的检测项
+GOOGLE_FEATURES = (
+    {"type": "OBJECT_LOCALIZATION", "maxResults": 10},
+    {"type": "LABEL_DETECTION", "maxResults": 10},
+    {"type": "FACE_DETECTION", "maxResults": 10},
+    {"type": "TEXT_DETECTION", "maxResults": 5},
+    {"type": "LANDMARK_DETECTION", "maxResults": 5}
+)
+# 只提取文字时的检测项
+GOOGLE_TEXT_FEATURES = (
+    {"type": "DOCUMENT_TEXT_DETECTION", "maxResults": 1},
+)
+# 以JSON请求体发送时使用的请求头
+JSON_HEADERS = {'Content-Type': 'application/json'}
+# 从文字描述中提取的物体和标签关键词
+DESCRIPTION_OBJECT_KEYWORDS = ('人', '车', '建筑', '动物', '植物', '食物', '家具')
+DESCRIPTION_LABEL_KEYWORDS = ('室内', '室外', '白天', '夜晚', '明亮', '昏暗')
+
+class _HistRec:
+    """一条分析历史记录"""
+    __slots__ = ('timestamp', 'service', 'objects_count', 'faces_count', 'confidence', 'description')
+    
+    def __init__(self, timestamp: float, service: str, objects_count: int, faces_count: int,
+                 confidence: float, description: str):
+        self.timestamp = timestamp
+        self.service = service
+        self.objects_count = objects_count
+        self.faces_count = faces_count
+        self.confidence = confidence
+        self.description = description
+
+def _json_body(payload: Dict) -> bytes:
+    """把请求体编码为JSON bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+def _b64encode(data: bytes) -> str:
+    """把图像编码为base64字符串"""
+    if pybase64 is not None:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode()
+
 class EnhancedVision:
     """增强视觉系统 - 支持物体识别、场景理解、OCR等"""
     
@@ -33,9 +119,40 @@ class EnhancedVision:
             'openai': self._analyze_with_openai_vision
         }
         
-        # 分析历史
-        self.analysis_history = []
+        # 所有视觉API共用一个连接池，复用TCP/TLS连接
+        self._session = requests.Session()
+        # 分析请求按次计费且不幂等：只重试连接失败和服务端明确未处理的状态码，
+        # 读超时不重发，并遵守 Retry-After
+        retry = Retry(total=VISION_RETRIES, connect=VISION_RETRIES, read=0,
+                      status=VISION_RETRIES, backoff_factor=VISION_RETRY_BACKOFF,
+                      status_forcelist=VISION_RETRY_STATUSES, allowed_methods=['POST'],
+                      respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        
+        # 协程接口把分析交给线程池，同时进行的请求数受线程数限制
+        self._executor = ThreadPoolExecutor(max_workers=VISION_MAX_WORKERS,
+                                            thread_name_prefix='vision')
+        
+        # 分析结果缓存: (服务, 图像摘要) -> 结果，按最近使用排序
+        self._result_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+        # 本地降级分析用的人脸检测器，首次使用时加载
+        self._face_cascade = None
+        self._face_cascade_lock = threading.Lock()
+        
+        # 分析历史，超出长度时自动丢弃最旧的记录
         self.max_history = 50
+        self.analysis_history = deque(maxlen=self.max_history)
+        
+        # 历史记录的累计值，随记录增删更新，总结时无需重新遍历
+        self._history_lock = threading.Lock()
+        self._sum_confidence = 0.0
+        self._sum_objects = 0
+        self._sum_faces = 0
+        self._service_counts = Counter()
         
         # 物体分类映射
         self.object_categories = {
@@ -49,6 +166,23 @@ class EnhancedVision:
             'electronics': '电子设备',
             'text': '文字内容'
         }
+        
+        # 关键词 -> 分类；名称恰好是关键词时一次查表即可
+        self._word_to_category = {
+            word: self.object_categories[category]
+            for category, words in CATEGORY_KEYWORDS for word in words
+        }
+        # 其余名称用一个正则找出所有位置出现的关键词（包括重叠的），取优先级最高的
+        self._keyword_rank = {
+            word: rank for rank, word in enumerate(
+                word for _, words in CATEGORY_KEYWORDS for word in words)
+        }
+        self._keyword_pattern = re.compile(
+            '(?=(' + '|'.join(self._keyword_rank) + '))')
+        
+        # 描述关键词各合成一个正则，一次扫描找出全部
+        self._object_kw_re = re.compile('|'.join(map(re.escape, DESCRIPTION_OBJECT_KEYWORDS)))
+        self._label_kw_re = re.compile('|'.join(map(re.escape, DESCRIPTION_LABEL_KEYWORDS)))
     
     def analyze_image(self, image_data: bytes, service: str = 'google') -> Dict[str, Any]:
         """分析图像 - 检测物体、理解场景"""
@@ -56,9 +190,15 @@ class EnhancedVision:
             if service not in self.vision_services:
                 service = 'google'  # 默认使用Google Vision
             
-            # 选择分析服务
-            analysis_func = self.vision_services[service]
-            result = analysis_func(image_data)
+            # 同一张图像重复到达时直接使用缓存结果
+            key = self._cache_key(service, image_data)
+            result = self._cached_result(key)
+            
+            if result is None:
+                # 选择分析服务
+                analysis_func = self.vision_services[service]
+                result = analysis_func(image_data)
+                self._store_result(key, result)
             
             # 记录分析历史
             self._record_analysis(result, service)
@@ -69,6 +209,114 @@ class EnhancedVision:
             logger.error(f"图像分析失败: {e}")
             return self._get_fallback_analysis(image_data)
     
+    def _cache_key(self, service: str, image_data: bytes) -> Tuple[str, bytes]:
+        """结果缓存的键: (服务, 图像摘要)"""
+        return (service, hashlib.blake2b(image_data, digest_size=16).digest())
+    
+    def _cached_result(self, key: Tuple[str, bytes]) -> Optional[Dict[str, Any]]:
+        """取出缓存结果的副本并更新时间戳，未命中时返回None"""
+        with self._cache_lock:
+            result = self._result_cache.get(key)
+            if result is None:
+                return None
+            self._result_cache.move_to_end(key)
+        
+        # 返回深拷贝，调用方修改结果（包括其中的列表）不会影响缓存
+        result = copy.deepcopy(result)
+        result['timestamp'] = time.time()
+        return result
+    
+    def _store_result(self, key: Tuple[str, bytes], result: Dict[str, Any]):
+        """缓存远端API的分析结果（保存深拷贝），本地降级结果和出错的结果不缓存"""
+        if result.get('service') in LOCAL_SERVICES or 'error' in result:
+            return
+        result = copy.deepcopy(result)
+        with self._cache_lock:
+            self._result_cache[key] = result
+            if len(self._result_cache) > RESULT_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+    
+    async def analyze_image_async(self, image_data: bytes, service: str = 'google') -> Dict[str, Any]:
+        """分析图像（协程版本，不阻塞事件循环）"""
+        future = self._executor.submit(self.analyze_image, image_data, service)
+        return await asyncio.wrap_future(future)
+    
+    async def analyze_images_async(self, images: List[bytes], service: str = 'google') -> List[Dict[str, Any]]:
+        """并发分析多张图像（协程版本），结果顺序与输入一致"""
+        return await asyncio.gather(*(self.analyze_image_async(image, service) for image in images))
+    
+    def analyze_images_batch(self, images: List[bytes], service: str = 'google') -> List[Dict[str, Any]]:
+        """批量分析多张图像，结果顺序与输入一致，已缓存的图像不再请求"""
+        if service not in self.vision_services:
+            service = 'google'
+        
+        if service != 'google':
+            # 没有批量接口的服务并发逐张分析，缓存和历史记录由 analyze_image 处理
+            return list(self._executor.map(self.analyze_image, images, itertools.repeat(service)))
+        
+        keys = [self._cache_key(service, image_data) for image_data in images]
+        results = [self._cached_result(key) for key in keys]
+        
+        # Google Vision 一次请求可以分析多张图像，只发送未命中缓存的部分
+        missing = [i for i, result in enumerate(results) if result is None]
+        for start in range(0, len(missing), GOOGLE_BATCH_SIZE):
+            indices = missing[start:start + GOOGLE_BATCH_SIZE]
+            batch_results = self._analyze_google_batch([images[i] for i in indices])
+            for i, result in zip(indices, batch_results):
+                self._store_result(keys[i], result)
+                results[i] = result
+        
+        for result in results:
+            self._record_analysis(result, service)
+        
+        return results
+    
+    def _prepare_payload(self, image_data: bytes) -> bytes:
+        """上传前把图像缩小到最长边不超过配置值，并重新压缩为JPEG"""
+        if cv2 is None:
+            return image_data
+        
+        try:
+            img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                return image_data
+            
+            max_side = settings.enhanced_vision.upload_max_side
+            height, width = img.shape[:2]
+            resized = max(height, width) > max_side
+            if resized:
+                scale = max_side / max(height, width)
+                img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            
+            ok, encoded = cv2.imencode('.jpg', img, 
+                                       [cv2.IMWRITE_JPEG_QUALITY, settings.enhanced_vision.upload_jpeg_quality])
+            if not ok:
+                return image_data
+            
+            # 没有缩小且重新压缩也没变小时保留原图
+            if not resized and encoded.nbytes >= len(image_data):
+                return image_data
+            return encoded.tobytes()
+            
+        except Exception as e:
+            logger.error(f"图像预处理失败: {e}")
+            return image_data
+    
+    def _google_image_request(self, image_data: bytes, features=GOOGLE_FEATURES,
+                              downscale: bool = True) -> Dict[str, Any]:
+        """构造Google Vision请求中单张图像的部分，downscale为False时上传原图"""
+        # 编码图像为base64，默认先缩小
+        if downscale:
+            image_data = self._prepare_payload(image_data)
+        image_base64 = _b64encode(image_data)
+        
+        return {
+            "image": {
+                "content": image_base64
+            },
+            "features": list(features)
+        }
+    
     def _analyze_with_google_vision(self, image_data: bytes) -> Dict[str, Any]:
         """使用Google Vision API分析图像"""
         try:
@@ -76,29 +324,13 @@ class EnhancedVision:
             if not api_key:
                 return self._get_fallback_analysis(image_data)
             
-            # 编码图像为base64
-            image_base64 = base64.b64encode(image_data).decode()
-            
             url = f"https://vision.googleapis.com/v1/images:annotate?key={api_key}"
             
             payload = {
-                "requests": [
-                    {
-                        "image": {
-                            "content": image_base64
-                        },
-                        "features": [
-                            {"type": "OBJECT_LOCALIZATION", "maxResults": 10},
-                            {"type": "LABEL_DETECTION", "maxResults": 10},
-                            {"type": "FACE_DETECTION", "maxResults": 10},
-                            {"type": "TEXT_DETECTION", "maxResults": 5},
-                            {"type": "LANDMARK_DETECTION", "maxResults": 5}
-                        ]
-                    }
-                ]
+                "requests": [self._google_image_request(image_data)]
             }
             
-            response = requests.post(url, json=payload, timeout=30)
+            response = self._session.post(url, headers=JSON_HEADERS, data=_json_body(payload), timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -108,6 +340,57 @@ class EnhancedVision:
             logger.error(f"Google Vision分析失败: {e}")
             return self._get_fallback_analysis(image_data)
     
+    def _analyze_google_text_only(self, image_data: bytes) -> str:
+        """只请求Google Vision的文字检测，返回识别出的全文"""
+        try:
+            api_key = getattr(settings.ai, 'google_vision_api_key', '')
+            if not api_key:
+                return ""
+            
+            url = f"https://vision.googleapis.com/v1/images:annotate?key={api_key}"
+            
+            payload = {
+                # 文字识别上传原图，缩小和JPEG重新压缩会让截图中的小字无法识别
+                "requests": [self._google_image_request(image_data, GOOGLE_TEXT_FEATURES, downscale=False)]
+            }
+            
+            response = self._session.post(url, headers=JSON_HEADERS, data=_json_body(payload), timeout=30)
+            response.raise_for_status()
+            
+            responses = response.json().get('responses', [])
+            annotations = responses[0].get('textAnnotations') if responses else None
+            # 第一项是整段文字，其余是逐词结果
+            return annotations[0].get('description', '') if annotations else ""
+            
+        except Exception as e:
+            logger.error(f"Google文字识别失败: {e}")
+            return ""
+    
+    def _analyze_google_batch(self, images: List[bytes]) -> List[Dict[str, Any]]:
+        """用一次Google Vision请求分析多张图像"""
+        try:
+            api_key = getattr(settings.ai, 'google_vision_api_key', '')
+            if not api_key:
+                return [self._get_fallback_analysis(image_data) for image_data in images]
+            
+            url = f"https://vision.googleapis.com/v1/images:annotate?key={api_key}"
+            
+            payload = {
+                "requests": [self._google_image_request(image_data) for image_data in images]
+            }
+            
+            response = self._session.post(url, headers=JSON_HEADERS, data=_json_body(payload), timeout=30)
+            response.raise_for_status()
+            
+            # 响应按请求顺序一一对应
+            responses = response.json().get('responses', [])
+            return [self._parse_google_annotation(responses[i] if i < len(responses) else None)
+                    for i in range(len(images))]
+            
+        except Exception as e:
+            logger.error(f"Google Vision批量分析失败: {e}")
+            return [self._get_fallback_analysis(image_data) for image_data in images]
+    
     def _analyze_with_azure_vision(self, image_data: bytes) -> Dict[str, Any]:
         """使用Azure Computer Vision分析图像"""
         try:
@@ -129,8 +412,8 @@ class EnhancedVision:
                 'details': 'Landmarks,Celebrities'
             }
             
-            response = requests.post(url, headers=headers, params=params, 
-                                   data=image_data, timeout=30)
+            response = self._session.post(url, headers=headers, params=params, 
+                                          data=self._prepare_payload(image_data), timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -147,8 +430,8 @@ class EnhancedVision:
             if not api_key:
                 return self._get_fallback_analysis(image_data)
             
-            # 编码图像为base64
-            image_base64 = base64.b64encode(image_data).decode()
+            # 缩小后编码图像为base64
+            image_base64 = _b64encode(self._prepare_payload(image_data))
             
             url = "https://api.openai.com/v1/chat/completions"
             
@@ -179,7 +462,7 @@ class EnhancedVision:
                 "max_tokens": 500
             }
             
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = self._session.post(url, headers=headers, data=_json_body(payload), timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -191,9 +474,14 @@ class EnhancedVision:
     
     def _parse_google_vision_response(self, data: Dict) -> Dict[str, Any]:
         """解析Google Vision API响应"""
+        responses = data.get('responses', [])
+        return self._parse_google_annotation(responses[0] if responses else None)
+    
+    def _parse_google_annotation(self, response: Optional[Dict]) -> Dict[str, Any]:
+        """解析Google Vision响应中单张图像的结果"""
         result = {
             'service': 'google_vision',
-            'timestamp': datetime.now(),
+            'timestamp': time.time(),
             'objects': [],
             'labels': [],
             'faces': [],
@@ -204,11 +492,15 @@ class EnhancedVision:
         }
         
         try:
-            responses = data.get('responses', [])
-            if not responses:
+            if not response:
+                result['error'] = '响应中缺少该图像的结果'
                 return result
             
-            response = responses[0]
+            if 'error' in response:
+                # 单张图像失败时整个请求仍然成功，标记出来以免被当作空结果缓存
+                result['error'] = response['error'].get('message', '')
+                logger.warning(f"Google Vision图像分析失败: {result['error']}")
+                return result
             
             # 解析物体检测
             if 'localizedObjectAnnotations' in response:
@@ -235,9 +527,9 @@ class EnhancedVision:
                 } for face in response['faceAnnotations']]
             
             # 解析文字
-            if 'textAnnotations' in response:
-                texts = [t.get('description', '') for t in response['textAnnotations']]
-                result['text'] = ' '.join(texts)
+            # 第一项是整段文字，其余是逐词结果，只取第一项
+            if response.get('textAnnotations'):
+                result['text'] = response['textAnnotations'][0].get('description', '')
             
             # 生成场景描述
             result['scene_description'] = self._generate_scene_description(result)
@@ -252,7 +544,7 @@ class EnhancedVision:
         """解析Azure Vision响应"""
         result = {
             'service': 'azure_vision',
-            'timestamp': datetime.now(),
+            'timestamp': time.time(),
             'objects': [],
             'labels': [],
             'faces': [],
@@ -303,7 +595,7 @@ class EnhancedVision:
         """解析OpenAI Vision响应"""
         result = {
             'service': 'openai_vision',
-            'timestamp': datetime.now(),
+            'timestamp': time.time(),
             'objects': [],
             'labels': [],
             'faces': [],
@@ -331,25 +623,15 @@ class EnhancedVision:
         """将物体分类"""
         object_name_lower = object_name.lower()
         
-        # 简单的分类逻辑
-        if any(word in object_name_lower for word in ['person', 'man', 'woman', 'child', 'people']):
-            return self.object_categories['person']
-        elif any(word in object_name_lower for word in ['dog', 'cat', 'bird', 'animal']):
-            return self.object_categories['animal']
-        elif any(word in object_name_lower for word in ['car', 'bus', 'truck', 'bicycle']):
-            return self.object_categories['vehicle']
-        elif any(word in object_name_lower for word in ['chair', 'table', 'sofa', 'bed']):
-            return self.object_categories['furniture']
-        elif any(word in object_name_lower for word in ['food', 'drink', 'fruit', 'meal']):
-            return self.object_categories['food']
-        elif any(word in object_name_lower for word in ['tree', 'flower', 'grass', 'sky']):
-            return self.object_categories['nature']
-        elif any(word in object_name_lower for word in ['building', 'house', 'office']):
-            return self.object_categories['building']
-        elif any(word in object_name_lower for word in ['phone', 'computer', 'screen']):
-            return self.object_categories['electronics']
-        else:
-            return '其他'
+        category = self._word_to_category.get(object_name_lower)
+        if category is not None:
+            return category
+        
+        # 名称中包含关键词即归入对应分类，多个分类都匹配时按关键词优先级
+        matches = self._keyword_pattern.findall(object_name_lower)
+        if matches:
+            return self._word_to_category[min(matches, key=self._keyword_rank.__getitem__)]
+        return '其他'
     
     def _parse_face_emotions(self, face_data: Dict) -> Dict[str, float]:
         """解析人脸情绪"""
@@ -413,40 +695,27 @@ class EnhancedVision:
     
     def _extract_objects_from_description(self, description: str) -> List[Dict]:
         """从描述中提取物体信息"""
-        # 简单的关键词匹配
-        objects = []
-        keywords = ['人', '车', '建筑', '动物', '植物', '食物', '家具']
-        
-        for keyword in keywords:
-            if keyword in description:
-                objects.append({
-                    'name': keyword,
-                    'confidence': 0.7,
-                    'category': keyword
-                })
-        
-        return objects
+        # 简单的关键词匹配，结果按关键词表的顺序排列
+        found = set(self._object_kw_re.findall(description))
+        return [
+            {'name': keyword, 'confidence': 0.7, 'category': keyword}
+            for keyword in DESCRIPTION_OBJECT_KEYWORDS if keyword in found
+        ]
     
     def _extract_labels_from_description(self, description: str) -> List[Dict]:
         """从描述中提取标签"""
         # 简单的关键词提取
-        labels = []
-        keywords = ['室内', '室外', '白天', '夜晚', '明亮', '昏暗']
-        
-        for keyword in keywords:
-            if keyword in description:
-                labels.append({
-                    'name': keyword,
-                    'confidence': 0.6
-                })
-        
-        return labels
+        found = set(self._label_kw_re.findall(description))
+        return [
+            {'name': keyword, 'confidence': 0.6}
+            for keyword in DESCRIPTION_LABEL_KEYWORDS if keyword in found
+        ]
     
     def _get_fallback_analysis(self, image_data: bytes) -> Dict[str, Any]:
         """本地图像分析回退方案"""
         result = {
             'service': 'local_fallback',
-            'timestamp': datetime.now(),
+            'timestamp': time.time(),
             'objects': [],
             'labels': [],
             'faces': [],
@@ -456,7 +725,7 @@ class EnhancedVision:
         }
         
         try:
-            if cv2 is not None and Image is not None:
+            if cv2 is not None:
                 # 使用OpenCV进行基础分析
                 result = self._basic_opencv_analysis(image_data)
         except Exception as e:
@@ -468,7 +737,7 @@ class EnhancedVision:
         """使用OpenCV进行基础图像分析"""
         result = {
             'service': 'opencv_local',
-            'timestamp': datetime.now(),
+            'timestamp': time.time(),
             'objects': [],
             'labels': [],
             'faces': [],
@@ -486,15 +755,18 @@ class EnhancedVision:
                 return result
             
             # 基础人脸检测
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
             gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+            with self._face_cascade_lock:
+                face_cascade = self._get_face_cascade()
+                if settings.enhanced_vision.face_detection_opencl and cv2.ocl.useOpenCL():
+                    # 配置开启且进程已启用OpenCL时用UMat，检测交给GPU执行
+                    gray = cv2.UMat(gray)
+                faces = face_cascade.detectMultiScale(gray, 1.1, 4)
             
             result['faces'] = [{'confidence': 0.7} for _ in faces]
             
-            # 基础色彩分析
-            avg_color = np.mean(img, axis=(0, 1))
-            brightness = np.mean(avg_color)
+            # 基础色彩分析：三个通道均值的平均
+            brightness = sum(cv2.mean(img)[:3]) / 3
             
             if brightness > 128:
                 result['labels'].append({'name': '明亮', 'confidence': 0.6})
@@ -511,36 +783,56 @@ class EnhancedVision:
         
         return result
     
+    def _get_face_cascade(self):
+        """获取人脸检测器（调用方需持有 _face_cascade_lock）"""
+        if self._face_cascade is None:
+            self._face_cascade = cv2.CascadeClassifier(
+                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        return self._face_cascade
+    
     def _record_analysis(self, result: Dict, service: str):
         """记录分析历史"""
-        record = {
-            'timestamp': result['timestamp'],
-            'service': service,
-            'objects_count': len(result['objects']),
-            'faces_count': len(result['faces']),
-            'confidence': result['confidence_score'],
-            'description': result['scene_description'][:50] + '...' if len(result['scene_description']) > 50 else result['scene_description']
-        }
-        
-        self.analysis_history.append(record)
+        description = result['scene_description']
+        record = _HistRec(
+            result['timestamp'],
+            service,
+            len(result['objects']),
+            len(result['faces']),
+            result['confidence_score'],
+            description[:50] + '...' if len(description) > 50 else description
+        )
         
-        # 保持历史长度
-        if len(self.analysis_history) > self.max_history:
-            self.analysis_history = self.analysis_history[-self.max_history:]
+        with self._history_lock:
+            # 历史已满时最旧的记录会被挤出，先从累计值中扣除
+            if len(self.analysis_history) == self.analysis_history.maxlen:
+                oldest = self.analysis_history[0]
+                self._sum_confidence -= oldest.confidence
+                self._sum_objects -= oldest.objects_count
+                self._sum_faces -= oldest.faces_count
+                self._service_counts[oldest.service] -= 1
+                if not self._service_counts[oldest.service]:
+                    del self._service_counts[oldest.service]
+            
+            self.analysis_history.append(record)
+            self._sum_confidence += record.confidence
+            self._sum_objects += record.objects_count
+            self._sum_faces += record.faces_count
+            self._service_counts[service] += 1
     
     def get_analysis_summary(self) -> Dict[str, Any]:
         """获取分析总结"""
         if not self.analysis_history:
             return {'total_analyses': 0}
         
-        total_analyses = len(self.analysis_history)
-        avg_confidence = sum(record['confidence'] for record in self.analysis_history) / total_analyses
-        total_objects = sum(record['objects_count'] for record in self.analysis_history)
-        total_faces = sum(record['faces_count'] for record in self.analysis_history)
-        
-        # 最常用的服务
-        services = [record['service'] for record in self.analysis_history]
-        most_used_service = max(set(services), key=services.count) if services else 'none'
+        with self._history_lock:
+            total_analyses = len(self.analysis_history)
+            avg_confidence = self._sum_confidence / total_analyses
+            total_objects = self._sum_objects
+            total_faces = self._sum_faces
+            
+            # 最常用的服务
+            most_used_service = self._service_counts.most_common(1)[0][0]
+            last_analysis_time = datetime.fromtimestamp(self.analysis_history[-1].timestamp)
         
         return {
             'total_analyses': total_analyses,
@@ -548,15 +840,19 @@ class EnhancedVision:
             'total_objects_detected': total_objects,
             'total_faces_detected': total_faces,
             'most_used_service': most_used_service,
-            'last_analysis_time': self.analysis_history[-1]['timestamp']
+            'last_analysis_time': last_analysis_time
         }
     
     def extract_text_from_image(self, image_data: bytes) -> str:
         """从图像中提取文字（OCR）"""
         try:
-            # 优先使用云端OCR服务
-            analysis = self.analyze_image(image_data, service='google')
-            return analysis.get('text', '')
+            # 使用云端OCR服务，只请求文字检测
+            return self._analyze_google_text_only(image_data)
         except Exception as e:
             logger.error(f"OCR文字提取失败: {e}")
-            return ""
\ No newline at end of file
+            return ""
+    
+    def close(self):
+        """关闭HTTP连接池和分析线程池"""
+        self._executor.shutdown(wait=False)
+        self._session.close()
@@ -7,10 +7,14 @@ import unittest
 import asyncio
 from unittest.mock import Mock, patch
 import time
+import threading
 
 # 添加src目录到Python路径
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
+# 没有声卡的环境下让pygame使用空音频设备
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
 # 创建测试目录
 os.makedirs("logs", exist_ok=True)
 os.makedirs("data", exist_ok=True)
@@ -123,7 +127,27 @@ class TestKnowledgeSystem(unittest.TestCase):
         results = self.web_searcher.search("测试查询")
         self.assertIsInstance(results, list)
         self.assertGreaterEqual(len(results), 1)  # 至少有回退结果
-    
+
+    def test_search_skip_seen(self):
+        """测试跳过本次会话中已返回过的URL"""
+        def fake_results(*urls):
+            return [{'title': url, 'url': url, 'snippet': url, 'source': 'duckduckgo'} for url in urls]
+
+        engine = Mock(side_effect=[
+            fake_results('https://a.example', 'https://b.example'),
+            fake_results('https://a.example', 'https://b.example', 'https://c.example'),
+            fake_results('https://a.example', 'https://c.example'),
+        ])
+        self.web_searcher.search_engines['duckduckgo'] = engine
+
+        with patch.object(self.web_searcher, '_select_engines', return_value=['duckduckgo']):
+            self.web_searcher.search("测试查询", max_results=5)
+            fresh = self.web_searcher.search("测试查询", max_results=5, skip_seen=True)
+            repeated = self.web_searcher.search("测试查询", max_results=5)
+
+        self.assertEqual([r['url'] for r in fresh], ['https://c.example'])
+        self.assertEqual([r['url'] for r in repeated], ['https://a.example', 'https://c.example'])
+
     def test_content_analysis(self):
         """测试内容分析"""
         # 模拟搜索结果
@@ -251,7 +275,7 @@ class TestSystemIntegration(unittest.TestCase):
     def test_knowledge_emotion_integration(self):
         """测试知识管理和情绪系统集成"""
         # 模拟发现有趣内容
-        self.knowledge_manager.knowledge_base['discoveries'].append({
+        self.knowledge_manager.add_discovery({
             "title": "惊人的科学发现",
             "snippet": "科学家发现了一个令人兴奋的新现象",
             "interest_score": 0.9,
@@ -264,6 +288,222 @@ class TestSystemIntegration(unittest.TestCase):
             self.assertIsInstance(discovery, dict)
             self.assertIn("title", discovery)
 
+class TestVoiceSynthesis(unittest.TestCase):
+    """测试语音合成"""
+    
+    def setUp(self):
+        try:
+            from src.interface import voice_synthesis
+        except Exception as e:
+            self.skipTest(f"语音合成模块不可用: {e}")
+        if voice_synthesis.pygame is None:
+            self.skipTest("pygame未安装")
+        self.module = voice_synthesis
+        self.voice = voice_synthesis.VoiceSynthesis()
+    
+    def tearDown(self):
+        self.voice.shutdown()
+    
+    def test_stop_speaking_mid_stream(self):
+        """测试流式播放中途停止后不再下载和排入音频"""
+        channel = Mock()
+        channel.get_queue.return_value = None
+        channel.get_busy.return_value = False
+        
+        chunk = bytes(self.module.PCM_CHUNK_SIZE)
+        state = {'received': 0, 'closed': False, 'queued_at_stop': None}
+        
+        def stream():
+            try:
+                for i in range(50):
+                    if i == 8:
+                        self.voice.stop_speaking()
+                        state['queued_at_stop'] = channel.queue.call_count
+                    state['received'] += 1
+                    yield chunk
+            finally:
+                state['closed'] = True
+        
+        with patch.object(self.module.pygame.mixer, 'find_channel', return_value=channel):
+            self.voice._playback_stop.clear()
+            self.voice._play_pcm_stream(stream())
+        
+        self.assertTrue(channel.play.called)
+        self.assertEqual(channel.queue.call_count, state['queued_at_stop'])
+        self.assertLessEqual(state['received'], 9)
+        self.assertTrue(state['closed'])
+
+class TestEnhancedVision(unittest.TestCase):
+    """测试增强视觉"""
+    
+    def setUp(self):
+        try:
+            from src.perception.enhanced_vision import EnhancedVision
+        except Exception as e:
+            self.skipTest(f"增强视觉模块不可用: {e}")
+        self.vision = EnhancedVision()
+    
+    def tearDown(self):
+        self.vision.close()
+    
+    def _fake_result(self, service='google_vision', objects=1, faces=0, confidence=0.8):
+        return {
+            'service': service,
+            'timestamp': time.time(),
+            'objects': [{'name': 'Person', 'confidence': 0.9, 'category': '人物'}] * objects,
+            'labels': [],
+            'faces': [{'confidence': 0.9}] * faces,
+            'text': '',
+            'scene_description': '测试场景',
+            'confidence_score': confidence
+        }
+    
+    def test_cache_hit_returns_fresh_copy(self):
+        """测试缓存命中时返回带新时间戳的副本"""
+        service = Mock(side_effect=lambda image_data: self._fake_result())
+        self.vision.vision_services['google'] = service
+        
+        first = self.vision.analyze_image(b'same image')
+        time.sleep(0.01)
+        second = self.vision.analyze_image(b'same image')
+        
+        self.assertEqual(service.call_count, 1)
+        self.assertIsNot(first, second)
+        self.assertGreater(second['timestamp'], first['timestamp'])
+        self.assertAlmostEqual(self.vision.get_analysis_summary()['last_analysis_time'].timestamp(),
+                               second['timestamp'], places=3)
+        
+        # 调用方修改结果（包括其中的列表）不影响缓存
+        first['objects'].append({'name': 'Cat', 'confidence': 0.5, 'category': '动物'})
+        second['scene_description'] = '被修改'
+        second['objects'].clear()
+        third = self.vision.analyze_image(b'same image')
+        self.assertEqual(third['scene_description'], '测试场景')
+        self.assertEqual(len(third['objects']), 1)
+
+    def test_error_result_not_cached(self):
+        """测试带错误的分析结果不进入缓存"""
+        def failed_result(image_data):
+            result = self._fake_result(objects=0)
+            result['error'] = 'Deadline exceeded'
+            return result
+        
+        service = Mock(side_effect=failed_result)
+        self.vision.vision_services['google'] = service
+        
+        self.vision.analyze_image(b'same image')
+        self.vision.analyze_image(b'same image')
+        self.assertEqual(service.call_count, 2)
+        
+        error = self.vision._parse_google_annotation({'error': {'code': 4, 'message': 'Deadline exceeded'}})
+        self.assertEqual(error['error'], 'Deadline exceeded')
+
+    def test_summary_totals_after_eviction(self):
+        """测试历史记录被挤出后累计值与重新计算一致"""
+        results = [self._fake_result(service='azure_vision', objects=3, faces=2, confidence=0.2)
+                   for _ in range(60)]
+        results += [self._fake_result(service='local_opencv' if i % 3 == 0 else 'google_vision',
+                                      objects=i % 4, faces=i % 2, confidence=(i % 10) / 10)
+                    for i in range(70)]
+        for result in results:
+            self.vision._record_analysis(result, result['service'])
+
+        kept = results[-self.vision.max_history:]
+        summary = self.vision.get_analysis_summary()
+        self.assertEqual(summary['total_analyses'], len(kept))
+        self.assertAlmostEqual(summary['average_confidence'],
+                               sum(r['confidence_score'] for r in kept) / len(kept))
+        self.assertEqual(summary['total_objects_detected'], sum(len(r['objects']) for r in kept))
+        self.assertEqual(summary['total_faces_detected'], sum(len(r['faces']) for r in kept))
+        self.assertEqual(summary['most_used_service'], 'google_vision')
+
+    def test_categorize_object_keyword_order(self):
+        """测试物体分类与逐类按顺序匹配关键词的结果一致"""
+        categories = self.vision.object_categories
+        ordered_keywords = [
+            ('person', ['person', 'man', 'woman', 'child', 'people']),
+            ('animal', ['dog', 'cat', 'bird', 'animal']),
+            ('vehicle', ['car', 'bus', 'truck', 'bicycle']),
+            ('furniture', ['chair', 'table', 'sofa', 'bed']),
+            ('food', ['food', 'drink', 'fruit', 'meal']),
+            ('nature', ['tree', 'flower', 'grass', 'sky']),
+            ('building', ['building', 'house', 'office']),
+            ('electronics', ['phone', 'computer', 'screen']),
+        ]
+
+        def expected(name):
+            name = name.lower()
+            for category, words in ordered_keywords:
+                if any(word in name for word in words):
+                    return categories[category]
+            return '其他'
+
+        names = ['Person', 'woman', 'Laptop computer', 'Mug', 'bedog', 'Cat bed', 'carpet',
+                 'Tablet', 'skyscraper', 'Office chair', 'Smartphone', 'hotdog', 'Fruit tree',
+                 'Bus shelter', 'Screenhouse', 'Wine glass', '']
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(self.vision._categorize_object(name), expected(name))
+
+class TestAudioPerception(unittest.TestCase):
+    """测试音频感知"""
+    
+    def setUp(self):
+        try:
+            from src.perception import audio_perception
+        except Exception as e:
+            self.skipTest(f"音频感知模块不可用: {e}")
+        if audio_perception.sr is None:
+            self.skipTest("speech_recognition模块未安装")
+        self.module = audio_perception
+        self.audio = audio_perception.AudioPerception()
+    
+    def tearDown(self):
+        self.audio._recognition_pool.shutdown(wait=True, cancel_futures=True)
+    
+    def _phrase(self, fill: bytes, seconds: float = 1.0):
+        rate, width = 16000, 2
+        return self.module.sr.AudioData(fill * int(rate * width * seconds), rate, width)
+    
+    def test_queued_phrases_merged(self):
+        """测试识别线程忙时排队的短语合并成一次识别"""
+        gate = threading.Event()
+        recognize = Mock()
+        # 先占住识别线程，后续短语都在排队
+        self.audio._recognition_pool.submit(gate.wait, 5)
+        
+        with patch.object(self.audio, '_recognize_speech', recognize):
+            first, second, third = self._phrase(b'a'), self._phrase(b'b'), self._phrase(b'c')
+            for phrase in (first, second, third):
+                self.audio._submit_recognition(phrase)
+            gate.set()
+            self.audio._recognition_pool.shutdown(wait=True)
+        
+        recognize.assert_called_once()
+        merged = recognize.call_args[0][0]
+        self.assertEqual(merged.frame_data, first.frame_data + second.frame_data + third.frame_data)
+        self.assertEqual(merged.sample_rate, third.sample_rate)
+    
+    def test_merge_limit_keeps_all_audio(self):
+        """测试超过最长时长或格式不同的短语单独识别，不丢弃已排队的音频"""
+        gate = threading.Event()
+        recognize = Mock()
+        self.audio._recognition_pool.submit(gate.wait, 5)
+        
+        phrases = [self._phrase(fill, 5) for fill in (b'a', b'b', b'c', b'd', b'e')]
+        phrases.append(self.module.sr.AudioData(b'f' * 100, 8000, 2))
+        with patch.object(self.audio, '_recognize_speech', recognize):
+            for phrase in phrases:
+                self.audio._submit_recognition(phrase)
+            gate.set()
+            self.audio._recognition_pool.shutdown(wait=True)
+        
+        recognized = [call[0][0].frame_data for call in recognize.call_args_list]
+        self.assertEqual(b''.join(recognized), b''.join(phrase.frame_data for phrase in phrases))
+        limit = self.module.MAX_MERGED_SECONDS * 16000 * 2
+        self.assertTrue(all(len(frame_data) <= limit for frame_data in recognized))
+        self.assertEqual(len(recognized), 3)
+
 def run_performance_test():
     """运行性能测试"""
     print("\n=== 性能测试 ===")
@@ -313,7 +553,10 @@ def run_comprehensive_test():
         TestKnowledgeSystem,
         TestAIBrain,
         TestDecisionMaker,
-        TestSystemIntegration
+        TestSystemIntegration,
+        TestVoiceSynthesis,
+        TestEnhancedVision,
+        TestAudioPerception
     ]
     
     total_tests = 0